@@ -0,0 +1,79 @@
+import io, time, tempfile, argparse, platform, contextlib
+from igor_compiler import IgorCompiler, IgorParser, IgorGeneratorTs
+from igor_compiler.utils import *
+from .corpus import Corpus
+
+def measure(results, name, fun):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        res = fun()
+    results.setdefault(name, []).append(time.perf_counter() - start)
+    return res
+
+def parse_all(engine, paths):
+    data = []
+    p = IgorParser(engine)
+    for f in paths:
+        if not p.parse(f):
+            raise p.error
+        data += p.data
+    return data
+
+def run(args, paths):
+    results = {}
+    for i in range(args.repeat):
+        datas = [measure(results, 'parse_' + e, lambda: parse_all(e, paths)) for e in args.parser]
+        for d in datas[1:]:
+            if json2str(d) != json2str(datas[0]):
+                raise RuntimeError('parser engines ' + ', '.join(args.parser) + ' produce different schema')
+        data = datas[0]
+        measure(results, 'json2str', lambda: json2str(data))
+        measure(results, 'json2str_compact', lambda: json2str(data, True))
+        ts = measure(results, 'generator_init', lambda: IgorGeneratorTs(data))
+        measure(results, 'generate_data', ts.generate_data)
+        measure(results, 'generate_service', ts.generate_service)
+        measure(results, 'generate_notification', ts.generate_notification)
+    return {k: {'min': min(v), 'mean': sum(v) / len(v), 'runs': v} for k, v in results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='igor compiler benchmark')
+    parser.add_argument('--enums', type=int, default=50)
+    parser.add_argument('--records', type=int, default=200)
+    parser.add_argument('--services', type=int, default=100)
+    parser.add_argument('--notifications', type=int, default=20)
+    parser.add_argument('--files', type=int, default=1)
+    parser.add_argument('--enum-items', type=int, default=10)
+    parser.add_argument('--record-items', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=2, help='max list<>/dict<> nesting')
+    parser.add_argument('--inline-records', type=float, default=0.3, help='share of inline service/notification records')
+    parser.add_argument('--inline-enums', type=float, default=0.1, help='share of inline record enums')
+    parser.add_argument('--desc-density', type=float, default=0.3, help='share of items with description')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--parser', action='append', choices=['pypeg2', 'native'], help='parser engines to time, first is used for generation')
+    parser.add_argument('--corpus', help='keep generated corpus in this folder')
+    parser.add_argument('-o', '--output', help='results json file')
+    args = parser.parse_args()
+    args.parser = args.parser or ['native']
+
+    corpus = Corpus(args.enums, args.records, args.services, args.notifications, args.files,
+                    args.enum_items, args.record_items, args.depth,
+                    args.inline_records, args.inline_enums, args.desc_density, args.seed)
+    with tempfile.TemporaryDirectory() as temp:
+        paths = corpus.write(args.corpus or temp)
+        phases = run(args, paths)
+
+    results = {
+        'version': IgorCompiler().version,
+        'python': platform.python_version(),
+        'corpus': corpus.config,
+        'size': sum(len(a) for a in corpus.generate()),
+        'phases': phases,
+    }
+    for k, v in phases.items():
+        print('{0:24} {1:10.4f}s min {2:10.4f}s mean'.format(k, v['min'], v['mean']))
+    if args.output:
+        write_file(args.output, json2str(results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os, random
+
+simple_types = ['number', 'int', 'string', 'bool', 'json', 'Date']
+methods = ['GET', 'POST', 'PUT', 'DELETE']
+
+class Corpus:
+    def __init__(self, enums=50, records=200, services=100, notifications=20,
+                 files=1, enum_items=10, record_items=10, depth=2,
+                 inline_records=0.3, inline_enums=0.1, desc_density=0.3, seed=0):
+        self.enums = enums
+        self.records = records
+        self.services = services
+        self.notifications = notifications
+        self.files = files
+        self.enum_items = enum_items
+        self.record_items = record_items
+        self.depth = depth
+        self.inline_records = inline_records
+        self.inline_enums = inline_enums
+        self.desc_density = desc_density
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    @property
+    def config(self):
+        return {k: v for k, v in vars(self).items() if k != 'random'}
+
+    def chance(self, p):
+        return self.random.random() < p
+
+    def desc(self, indent, text):
+        if self.chance(self.desc_density):
+            return indent + '# ' + text + '\n'
+        return ''
+
+    def enum_name(self, i): return 'Enum{0}'.format(i)
+    def record_name(self, i): return 'Record{0}'.format(i)
+
+    def ref(self):
+        if self.records > 0 and (self.enums == 0 or self.chance(0.5)):
+            return self.record_name(self.random.randrange(self.records))
+        if self.enums > 0:
+            return self.enum_name(self.random.randrange(self.enums))
+        return 'int'
+
+    def type(self, depth=None):
+        depth = self.depth if depth == None else depth
+        if depth > 0 and self.chance(0.3):
+            if self.chance(0.5):
+                return 'list<' + self.type(depth - 1) + '>'
+            return 'dict<string, ' + self.type(depth - 1) + '>'
+        if self.chance(0.5):
+            return self.random.choice(simple_types)
+        return self.ref()
+
+    def enum_body(self, indent, name, index):
+        # items may refer to the same item of the previous enum, building acyclic ref chains
+        res = indent + '{\n'
+        for j in range(self.enum_items):
+            res += self.desc(indent + '    ', 'item {0} of {1}'.format(j, name))
+            if index > 0 and self.chance(0.2):
+                res += indent + '    {0}.item_{1};\n'.format(self.enum_name(index - 1), j)
+            else:
+                res += indent + '    item_{0};\n'.format(j)
+        return res + indent + '}\n'
+
+    def record_body(self, indent, name):
+        res = indent + '{\n'
+        for j in range(self.record_items):
+            inner = indent + '    '
+            res += self.desc(inner, 'field {0} of {1}'.format(j, name))
+            flags = ('@' if self.chance(0.1) else '') + ('?' if self.chance(0.2) else '')
+            if self.chance(self.inline_enums):
+                res += inner + 'enum {0}kind_{1}\n'.format(flags, j) + self.enum_body(inner, name, self.enums)
+            else:
+                res += inner + '{0}{1} field_{2};\n'.format(flags, self.type(), j)
+        return res + indent + '}\n'
+
+    def service_data(self, name):
+        if self.chance(self.inline_records):
+            return 'record\n' + self.record_body('    ', name)
+        return self.ref() + ';\n'
+
+    def enum(self, i):
+        name = self.enum_name(i)
+        return self.desc('', 'enum ' + name) + 'enum ' + name + '\n' + self.enum_body('', name, i)
+
+    def record(self, i):
+        name = self.record_name(i)
+        return self.desc('', 'record ' + name) + 'record ' + name + '\n' + self.record_body('', name)
+
+    def service(self, i):
+        name = 'service{0}'.format(i)
+        method = self.random.choice(methods)
+        res = self.desc('', 'service ' + name) + 'service ' + name + '\n{\n'
+        res += '    method {0};\n'.format(method)
+        res += '    url /api/{0}/{{id}};\n'.format(name)
+        res += self.desc('    ', 'id') + '    param int id;\n'
+        res += self.desc('    ', 'query') + '    query {0} filter;\n'.format(self.random.choice(simple_types))
+        if method != 'GET':
+            res += '    body ' + self.service_data(name)
+        res += self.desc('    ', 'ok') + '    response 200 ' + self.service_data(name)
+        res += '    response 400 ' + self.service_data(name)
+        return res + '}\n'
+
+    def notification(self, i):
+        name = 'Notify{0}'.format(i)
+        res = self.desc('', 'notification ' + name) + 'notification ' + name + '\n{\n'
+        if self.chance(0.5):
+            res += '    kind notify_{0};\n'.format(i)
+        res += '    payload ' + self.service_data(name)
+        return res + '}\n'
+
+    def definitions(self):
+        for i in range(self.enums): yield self.enum(i)
+        for i in range(self.records): yield self.record(i)
+        for i in range(self.services): yield self.service(i)
+        for i in range(self.notifications): yield self.notification(i)
+
+    def generate(self):
+        self.random.seed(self.seed)
+        files = [[] for i in range(max(self.files, 1))]
+        for i, text in enumerate(self.definitions()):
+            files[i % len(files)].append(text)
+        return ['\n'.join(a) for a in files]
+
+    def write(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for i, text in enumerate(self.generate()):
+            path = os.path.join(folder, 'corpus{0}.igor'.format(i))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            paths.append(path)
+        return paths
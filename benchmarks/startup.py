@@ -0,0 +1,50 @@
+import os, sys, glob, time, argparse, tempfile, subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+examples = sorted(glob.glob(os.path.join(root, 'examples', '*.igor')))
+lazy_modules = ['pypeg2', 'inflection', 'igor_compiler.grammar']
+
+def run(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'igor_compiler'] + args, cwd=root, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def loaded_modules():
+    code = 'import sys, igor_compiler.compiler; print(" ".join(m for m in {0!r} if m in sys.modules))'.format(lazy_modules)
+    res = subprocess.run([sys.executable, '-c', code], cwd=root, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return res.stdout.split()
+
+def main():
+    parser = argparse.ArgumentParser(description='igor compiler startup benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--parser', choices=['pypeg2', 'native'], default='pypeg2')
+    parser.add_argument('--budget-version', type=float, default=0.12, help='seconds allowed for -v')
+    parser.add_argument('--budget-schema', type=float, default=0.4, help='seconds allowed for a schema only run')
+    parser.add_argument('--budget-typescript', type=float, default=0.5, help='seconds allowed for a schema and typescript run')
+    args = parser.parse_args()
+
+    failed = []
+    eager = loaded_modules()
+    if eager:
+        failed.append('importing the compiler loads ' + ', '.join(eager))
+
+    with tempfile.TemporaryDirectory() as temp:
+        schema = ['-p', args.parser, '-s', os.path.join(temp, 'schema.json')] + examples
+        cases = [
+            ('version', ['-v'], args.budget_version),
+            ('schema', schema, args.budget_schema),
+            ('typescript', ['-t', temp] + schema, args.budget_typescript),
+        ]
+        for name, cmd, budget in cases:
+            best = min(run(cmd) for i in range(args.repeat))
+            ok = best <= budget
+            print('{0:12} {1:8.3f}s  budget {2:.3f}s  {3}'.format(name, best, budget, 'ok' if ok else 'FAILED'))
+            if not ok:
+                failed.append('{0} run took {1:.3f}s, budget {2:.3f}s'.format(name, best, budget))
+
+    for a in failed:
+        print('error: ' + a)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
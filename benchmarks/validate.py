@@ -0,0 +1,203 @@
+import re, sys, time, types, argparse, tempfile, inflection
+from igor_compiler import IgorParser, IgorGeneratorPy
+from .corpus import Corpus
+
+# generated validate_* functions against a validator interpreting schema.json
+# on every call, over the same valid and broken request samples
+
+simple_types = {
+    'int': lambda v: type(v) is int,
+    'number': lambda v: type(v) in (int, float),
+    'Date': lambda v: type(v) in (int, float),
+    'string': lambda v: type(v) is str,
+    'bool': lambda v: type(v) is bool,
+    'json': lambda v: True,
+}
+
+# url params and query values arrive as text
+int_text = re.compile(r'[-+]?[0-9]+\Z')
+number_text = re.compile(r'[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\Z')
+text_types = {
+    'int': lambda v: isinstance(v, str) and int_text.match(v) != None,
+    'number': lambda v: isinstance(v, str) and number_text.match(v) != None,
+    'Date': lambda v: isinstance(v, str) and number_text.match(v) != None,
+    'bool': lambda v: v in ('true', 'false'),
+}
+
+def text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value if isinstance(value, str) else str(value)
+
+class Interpreter:
+    def __init__(self, schema):
+        self.enums = {a['name']: {b['name'] for b in a['items']} for a in schema if a['tag'] == 'enum'}
+        self.records = {a['name']: a for a in schema if a['tag'] == 'record'}
+
+    def check(self, type, value):
+        tag = type['tag']
+        if tag == 'ref':
+            name = type['ref']
+            if name in self.enums:
+                return isinstance(value, str) and value in self.enums[name]
+            return self.record(self.records[name], value)
+        if tag == 'list':
+            return isinstance(value, list) and all(self.check(type['item_type'], a) for a in value)
+        if tag == 'dict':
+            return isinstance(value, dict) and all(self.check(type['value_type'], a) for a in value.values())
+        return simple_types[tag](value)
+
+    def check_text(self, type, value):
+        if type['tag'] == 'ref' and type['ref'] in self.enums:
+            return self.check(type, value)
+        return text_types.get(type['tag'], lambda v: isinstance(v, str))(value)
+
+    def record(self, record, value):
+        if not isinstance(value, dict):
+            return False
+        for a in record['items']:
+            v = value.get(a['name'])
+            if v is None:
+                if not a['optional'] and (not a['property'] or a['name'] in value):
+                    return False
+            elif not self.check(a['type'], v):
+                return False
+        return True
+
+    def request(self, service, params, query, body):
+        for part, members in ((params, service['params']), (query, service['query'])):
+            if members and not isinstance(part, dict):
+                return False
+            for a in members:
+                v = part.get(a['name'])
+                if v is None or not self.check_text(a['type'], v):
+                    return False
+        if service['body'] != None:
+            return body is not None and self.check(service['body'], body)
+        return True
+
+class Samples:
+    def __init__(self, schema):
+        self.enums = {a['name']: a['items'][0]['name'] for a in schema if a['tag'] == 'enum' and a['items']}
+        self.records = {a['name']: a for a in schema if a['tag'] == 'record'}
+        self.values = {'int': 1, 'number': 1.5, 'Date': 1500000000, 'string': 's', 'bool': True, 'json': {'a': [1]}}
+
+    # containers past the depth are left empty and optional fields out, records
+    # that can only be built infinitely deep raise RecursionError
+    def value(self, type, depth=0):
+        tag = type['tag']
+        if tag == 'ref':
+            name = type['ref']
+            if name in self.enums:
+                return self.enums[name]
+            return self.record(self.records[name], depth + 1)
+        size = 2 if depth < 3 else 0
+        if tag == 'list':
+            return [self.value(type['item_type'], depth) for i in range(size)]
+        if tag == 'dict':
+            return {'k{0}'.format(i): self.value(type['value_type'], depth) for i in range(size)}
+        return self.values[tag]
+
+    def record(self, record, depth):
+        if depth > 20:
+            raise RecursionError('record ' + record['name'] + ' has no finite sample')
+        return {a['name']: self.value(a['type'], depth) for a in record['items']
+                if not ((a['optional'] or a['property']) and depth > 2)}
+
+    def request(self, service):
+        return ({a['name']: text(self.value(a['type'])) for a in service['params']},
+                {a['name']: text(self.value(a['type'])) for a in service['query']},
+                self.value(service['body']) if service['body'] != None else None)
+
+# replaces the last leaf value it can reach with an object only json accepts
+def broken(value):
+    if isinstance(value, dict) and value:
+        key = sorted(value)[-1]
+        return dict(value, **{key: broken(value[key])})
+    if isinstance(value, list) and value:
+        return value[:-1] + [broken(value[-1])]
+    return object()
+
+def parse_all(paths):
+    data = []
+    p = IgorParser('native')
+    for f in paths:
+        if not p.parse(f):
+            raise p.error
+        data += p.data
+    return data
+
+def best(repeat, calls, fun, requests):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(calls):
+            for a in requests:
+                fun(*a)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='generated vs interpreted request validation benchmark')
+    parser.add_argument('--enums', type=int, default=50)
+    parser.add_argument('--records', type=int, default=200)
+    parser.add_argument('--services', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--calls', type=int, default=100, help='validations of each sample per run')
+    parser.add_argument('--corpus', default=None, help='keep generated corpus in this folder')
+    args = parser.parse_args()
+
+    corpus = Corpus(enums=args.enums, records=args.records, services=args.services, notifications=0, seed=args.seed)
+    with tempfile.TemporaryDirectory() as temp:
+        schema = parse_all(corpus.write(args.corpus or temp))
+
+    module = types.ModuleType('protocol')
+    exec(compile(IgorGeneratorPy(schema, verbose=False).generate(), 'protocol.py', 'exec'), module.__dict__)
+    interpreter = Interpreter(schema)
+    samples = Samples(schema)
+
+    generated, interpreted, invalid, skipped = [], [], [], 0
+    for a in schema:
+        if a['tag'] != 'service':
+            continue
+        try:
+            request = samples.request(a)
+        except RecursionError:
+            skipped += 1
+            continue
+        fun = getattr(module, 'validate_{0}_request'.format(inflection.underscore(a['name'])))
+        generated.append((fun, request))
+        interpreted.append((a, request))
+        if request[2] != None:
+            invalid.append((fun, a, (request[0], request[1], broken(request[2]))))
+        else:
+            invalid.append((fun, a, (request[0], broken(request[1]), None)))
+
+    failed, rejected = [], 0
+    for fun, request in generated:
+        fun(*request)
+    for service, request in interpreted:
+        if not interpreter.request(service, *request):
+            failed.append(service['name'] + ' sample rejected by the interpreter')
+    for fun, service, request in invalid:
+        try:
+            fun(*request)
+            accepted = True
+        except module.ValidationError:
+            accepted = False
+            rejected += 1
+        if accepted != interpreter.request(service, *request):
+            failed.append(service['name'] + ' broken sample ' + ('accepted' if accepted else 'rejected') + ' only by the generated validator')
+
+    run_generated = best(args.repeat, args.calls, lambda fun, request: fun(*request), generated)
+    run_interpreted = best(args.repeat, args.calls, lambda service, request: interpreter.request(service, *request), interpreted)
+    print('{0} requests, {1} broken samples rejected, {2} services without a finite sample skipped'.format(len(generated), rejected, skipped))
+    print('{0:12} {1:8.4f}s'.format('generated', run_generated))
+    print('{0:12} {1:8.4f}s  {2:.1f}x'.format('interpreted', run_interpreted, run_interpreted / run_generated))
+    for a in failed:
+        print('error: ' + a)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -75,6 +75,29 @@ function selectOptions(count: number, key: string, value: string, toValue: (data
     return res;
 }
 
+function itemsChanged(data: any): boolean
+{
+    if (data == null)
+        return false;
+    if (typeof data.toPatchJson === 'function')
+        return Object.keys(data.toPatchJson()).length > 0;
+    for (let key in data)
+        if (itemsChanged(data[key]))
+            return true;
+    return false;
+}
+
+function markItemsClean(data: any): void
+{
+    if (data == null)
+        return;
+    if (typeof data.markClean === 'function')
+        data.markClean();
+    else
+        for (let key in data)
+            markItemsClean(data[key]);
+}
+
 //  Some desc text
 export const enum SomeEnum
 {
@@ -83,36 +106,44 @@ export const enum SomeEnum
     Val2, //  important tag
     Count
 }
+const SomeEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'val1',
+    'val2'
+]);
+const SomeEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    '',
+    'important tag'
+]);
+const SomeEnumValues: ReadonlyMap<string, SomeEnum> = new Map<string, SomeEnum>([
+    ['val1', SomeEnum.Val1],
+    ['val2', SomeEnum.Val2]
+]);
 export function SomeEnumToString(val: SomeEnum)
 {
-    let arr = [
-        null,
-        'val1',
-        'val2'
-    ];
-    return arr[val]
+    return SomeEnumStrings[val];
 }
 export function SomeEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'val1': return SomeEnum.Val1;
-        case 'val2': return SomeEnum.Val2;
-        default: return SomeEnum.Null;
-    }
+    let val = SomeEnumValues.get(json);
+    return val === undefined ? SomeEnum.Null : val;
 }
 export function SomeEnumToDescription(val: SomeEnum)
 {
-    let arr = [
-        null,
-        '',
-        'important tag'
-    ];
-    return arr[val]
+    return SomeEnumDescriptions[val];
 }
 export function SomeEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(SomeEnum.Count, key, value, SomeEnumToDescription);
+    let res = [];
+    for (let i = 1; i < SomeEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = SomeEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 // 
@@ -124,39 +155,47 @@ export const enum GlobalEnum
     Global3, //  is it global_3
     Count
 }
+const GlobalEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'global_1',
+    'global_2',
+    'global_3'
+]);
+const GlobalEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    'is it global_1',
+    'is it global_2',
+    'is it global_3'
+]);
+const GlobalEnumValues: ReadonlyMap<string, GlobalEnum> = new Map<string, GlobalEnum>([
+    ['global_1', GlobalEnum.Global1],
+    ['global_2', GlobalEnum.Global2],
+    ['global_3', GlobalEnum.Global3]
+]);
 export function GlobalEnumToString(val: GlobalEnum)
 {
-    let arr = [
-        null,
-        'global_1',
-        'global_2',
-        'global_3'
-    ];
-    return arr[val]
+    return GlobalEnumStrings[val];
 }
 export function GlobalEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'global_1': return GlobalEnum.Global1;
-        case 'global_2': return GlobalEnum.Global2;
-        case 'global_3': return GlobalEnum.Global3;
-        default: return GlobalEnum.Null;
-    }
+    let val = GlobalEnumValues.get(json);
+    return val === undefined ? GlobalEnum.Null : val;
 }
 export function GlobalEnumToDescription(val: GlobalEnum)
 {
-    let arr = [
-        null,
-        'is it global_1',
-        'is it global_2',
-        'is it global_3'
-    ];
-    return arr[val]
+    return GlobalEnumDescriptions[val];
 }
 export function GlobalEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(GlobalEnum.Count, key, value, GlobalEnumToDescription);
+    let res = [];
+    for (let i = 1; i < GlobalEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = GlobalEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 // 
@@ -167,36 +206,44 @@ export const enum BigInnerRecordStatusEnum
     Data2, // 
     Count
 }
+const BigInnerRecordStatusEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'data1',
+    'data2'
+]);
+const BigInnerRecordStatusEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    '',
+    ''
+]);
+const BigInnerRecordStatusEnumValues: ReadonlyMap<string, BigInnerRecordStatusEnum> = new Map<string, BigInnerRecordStatusEnum>([
+    ['data1', BigInnerRecordStatusEnum.Data1],
+    ['data2', BigInnerRecordStatusEnum.Data2]
+]);
 export function BigInnerRecordStatusEnumToString(val: BigInnerRecordStatusEnum)
 {
-    let arr = [
-        null,
-        'data1',
-        'data2'
-    ];
-    return arr[val]
+    return BigInnerRecordStatusEnumStrings[val];
 }
 export function BigInnerRecordStatusEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'data1': return BigInnerRecordStatusEnum.Data1;
-        case 'data2': return BigInnerRecordStatusEnum.Data2;
-        default: return BigInnerRecordStatusEnum.Null;
-    }
+    let val = BigInnerRecordStatusEnumValues.get(json);
+    return val === undefined ? BigInnerRecordStatusEnum.Null : val;
 }
 export function BigInnerRecordStatusEnumToDescription(val: BigInnerRecordStatusEnum)
 {
-    let arr = [
-        null,
-        '',
-        ''
-    ];
-    return arr[val]
+    return BigInnerRecordStatusEnumDescriptions[val];
 }
 export function BigInnerRecordStatusEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(BigInnerRecordStatusEnum.Count, key, value, BigInnerRecordStatusEnumToDescription);
+    let res = [];
+    for (let i = 1; i < BigInnerRecordStatusEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = BigInnerRecordStatusEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 //  is it custom
@@ -208,39 +255,47 @@ export const enum BigInnerRecordCustomEnum
     MyVal3, // 
     Count
 }
+const BigInnerRecordCustomEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'my_val_1',
+    'global_3',
+    'my_val_3'
+]);
+const BigInnerRecordCustomEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    'is it my_val_1',
+    'is it global_3',
+    ''
+]);
+const BigInnerRecordCustomEnumValues: ReadonlyMap<string, BigInnerRecordCustomEnum> = new Map<string, BigInnerRecordCustomEnum>([
+    ['my_val_1', BigInnerRecordCustomEnum.MyVal1],
+    ['global_3', BigInnerRecordCustomEnum.Global3],
+    ['my_val_3', BigInnerRecordCustomEnum.MyVal3]
+]);
 export function BigInnerRecordCustomEnumToString(val: BigInnerRecordCustomEnum)
 {
-    let arr = [
-        null,
-        'my_val_1',
-        'global_3',
-        'my_val_3'
-    ];
-    return arr[val]
+    return BigInnerRecordCustomEnumStrings[val];
 }
 export function BigInnerRecordCustomEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'my_val_1': return BigInnerRecordCustomEnum.MyVal1;
-        case 'global_3': return BigInnerRecordCustomEnum.Global3;
-        case 'my_val_3': return BigInnerRecordCustomEnum.MyVal3;
-        default: return BigInnerRecordCustomEnum.Null;
-    }
+    let val = BigInnerRecordCustomEnumValues.get(json);
+    return val === undefined ? BigInnerRecordCustomEnum.Null : val;
 }
 export function BigInnerRecordCustomEnumToDescription(val: BigInnerRecordCustomEnum)
 {
-    let arr = [
-        null,
-        'is it my_val_1',
-        'is it global_3',
-        ''
-    ];
-    return arr[val]
+    return BigInnerRecordCustomEnumDescriptions[val];
 }
 export function BigInnerRecordCustomEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(BigInnerRecordCustomEnum.Count, key, value, BigInnerRecordCustomEnumToDescription);
+    let res = [];
+    for (let i = 1; i < BigInnerRecordCustomEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = BigInnerRecordCustomEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 // 
@@ -252,39 +307,47 @@ export const enum DeleteSecondRequestBodyItemEnum
     Global1, //  is it global_1
     Count
 }
+const DeleteSecondRequestBodyItemEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'type1',
+    'type2',
+    'global_1'
+]);
+const DeleteSecondRequestBodyItemEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    '',
+    '',
+    'is it global_1'
+]);
+const DeleteSecondRequestBodyItemEnumValues: ReadonlyMap<string, DeleteSecondRequestBodyItemEnum> = new Map<string, DeleteSecondRequestBodyItemEnum>([
+    ['type1', DeleteSecondRequestBodyItemEnum.Type1],
+    ['type2', DeleteSecondRequestBodyItemEnum.Type2],
+    ['global_1', DeleteSecondRequestBodyItemEnum.Global1]
+]);
 export function DeleteSecondRequestBodyItemEnumToString(val: DeleteSecondRequestBodyItemEnum)
 {
-    let arr = [
-        null,
-        'type1',
-        'type2',
-        'global_1'
-    ];
-    return arr[val]
+    return DeleteSecondRequestBodyItemEnumStrings[val];
 }
 export function DeleteSecondRequestBodyItemEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'type1': return DeleteSecondRequestBodyItemEnum.Type1;
-        case 'type2': return DeleteSecondRequestBodyItemEnum.Type2;
-        case 'global_1': return DeleteSecondRequestBodyItemEnum.Global1;
-        default: return DeleteSecondRequestBodyItemEnum.Null;
-    }
+    let val = DeleteSecondRequestBodyItemEnumValues.get(json);
+    return val === undefined ? DeleteSecondRequestBodyItemEnum.Null : val;
 }
 export function DeleteSecondRequestBodyItemEnumToDescription(val: DeleteSecondRequestBodyItemEnum)
 {
-    let arr = [
-        null,
-        '',
-        '',
-        'is it global_1'
-    ];
-    return arr[val]
+    return DeleteSecondRequestBodyItemEnumDescriptions[val];
 }
 export function DeleteSecondRequestBodyItemEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(DeleteSecondRequestBodyItemEnum.Count, key, value, DeleteSecondRequestBodyItemEnumToDescription);
+    let res = [];
+    for (let i = 1; i < DeleteSecondRequestBodyItemEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = DeleteSecondRequestBodyItemEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 // 
@@ -295,36 +358,44 @@ export const enum NotifyEnum
     Data2, // 
     Count
 }
+const NotifyEnumStrings: ReadonlyArray<string> = Object.freeze([
+    null,
+    'data1',
+    'data2'
+]);
+const NotifyEnumDescriptions: ReadonlyArray<string> = Object.freeze([
+    null,
+    '',
+    ''
+]);
+const NotifyEnumValues: ReadonlyMap<string, NotifyEnum> = new Map<string, NotifyEnum>([
+    ['data1', NotifyEnum.Data1],
+    ['data2', NotifyEnum.Data2]
+]);
 export function NotifyEnumToString(val: NotifyEnum)
 {
-    let arr = [
-        null,
-        'data1',
-        'data2'
-    ];
-    return arr[val]
+    return NotifyEnumStrings[val];
 }
 export function NotifyEnumFromString(json: string)
 {
-    switch(json)
-    {
-        case 'data1': return NotifyEnum.Data1;
-        case 'data2': return NotifyEnum.Data2;
-        default: return NotifyEnum.Null;
-    }
+    let val = NotifyEnumValues.get(json);
+    return val === undefined ? NotifyEnum.Null : val;
 }
 export function NotifyEnumToDescription(val: NotifyEnum)
 {
-    let arr = [
-        null,
-        '',
-        ''
-    ];
-    return arr[val]
+    return NotifyEnumDescriptions[val];
 }
 export function NotifyEnumToSelectOptions(key: string, value: string) : Array<Object>
 {
-    return selectOptions(NotifyEnum.Count, key, value, NotifyEnumToDescription);
+    let res = [];
+    for (let i = 1; i < NotifyEnumDescriptions.length; ++i)
+    {
+        let obj = {};
+        obj[key] = i;
+        obj[value] = NotifyEnumDescriptions[i];
+        res.push(obj);
+    }
+    return res;
 }
 
 export class RecordEmpty
@@ -537,30 +608,34 @@ export class PartialRecord
 {
     private _str: string; // 
     private _has_str: boolean = false;
+    private _dirty_str: boolean = false;
     get str() : string { return this._str; }
-    set str(val : string) { this._str = val; this._has_str = true; }
+    set str(val : string) { this._str = val; this._has_str = true; this._dirty_str = true; }
     private _optInt: number | null; // 
     private _has_optInt: boolean = false;
+    private _dirty_optInt: boolean = false;
     get optInt() : number | null { return this._optInt; }
-    set optInt(val : number | null) { this._optInt = val; this._has_optInt = true; }
+    set optInt(val : number | null) { this._optInt = val; this._has_optInt = true; this._dirty_optInt = true; }
     private _list: Array<string>; // 
     private _has_list: boolean = false;
+    private _dirty_list: boolean = false;
     get list() : Array<string> { return this._list; }
-    set list(val : Array<string>) { this._list = val; this._has_list = true; }
+    set list(val : Array<string>) { this._list = val; this._has_list = true; this._dirty_list = true; }
     private _myEnum: GlobalEnum | null; // 
     private _has_myEnum: boolean = false;
+    private _dirty_myEnum: boolean = false;
     get myEnum() : GlobalEnum | null { return this._myEnum; }
-    set myEnum(val : GlobalEnum | null) { this._myEnum = val; this._has_myEnum = true; }
+    set myEnum(val : GlobalEnum | null) { this._myEnum = val; this._has_myEnum = true; this._dirty_myEnum = true; }
     value: boolean; // 
     
     static fromJson(json: Object): PartialRecord
     {
         let obj = new PartialRecord();
         obj.value = <boolean>json['value'];
-        if ('str' in json) obj.str = <string>json['str'];
-        if ('opt_int' in json) obj.optInt = json['opt_int'] != null ? <number>json['opt_int'] : null;
-        if ('list' in json) obj.list = listFromJson(json['list'], el1 => <string>el1);
-        if ('my_enum' in json) obj.myEnum = json['my_enum'] != null ? GlobalEnumFromString(json['my_enum']) : null;
+        if ('str' in json) { obj._str = <string>json['str']; obj._has_str = true; }
+        if ('opt_int' in json) { obj._optInt = json['opt_int'] != null ? <number>json['opt_int'] : null; obj._has_optInt = true; }
+        if ('list' in json) { obj._list = listFromJson(json['list'], el1 => <string>el1); obj._has_list = true; }
+        if ('my_enum' in json) { obj._myEnum = json['my_enum'] != null ? GlobalEnumFromString(json['my_enum']) : null; obj._has_myEnum = true; }
         return obj;
     }
 
@@ -585,8 +660,30 @@ export class PartialRecord
         res.list = this.list == null ? null : listClone(this.list, el1 => stringClone(el1));
         res.myEnum = this.myEnum == null ? null : this.myEnum;
         res.value = this.value == null ? null : this.value;
+        res._dirty_str = this._dirty_str;
+        res._dirty_optInt = this._dirty_optInt;
+        res._dirty_list = this._dirty_list;
+        res._dirty_myEnum = this._dirty_myEnum;
         return res;
     }
+
+    toPatchJson(): Object
+    {
+        let obj: Object = {};
+        if (this._dirty_str) obj['str'] = this.str;
+        if (this._dirty_optInt) obj['opt_int'] = this.optInt == null ? null : this.optInt;
+        if (this._dirty_list) obj['list'] = listToJson(this.list, el1 => el1);
+        if (this._dirty_myEnum) obj['my_enum'] = this.myEnum == null ? null : GlobalEnumToString(this.myEnum);
+        return obj;
+    }
+
+    markClean(): void
+    {
+        this._dirty_str = false;
+        this._dirty_optInt = false;
+        this._dirty_list = false;
+        this._dirty_myEnum = false;
+    }
 }
 
 export class DeleteSecondRequestBody
@@ -657,8 +754,9 @@ export class NotifyRecord
 {
     private _str: string; // 
     private _has_str: boolean = false;
+    private _dirty_str: boolean = false;
     get str() : string { return this._str; }
-    set str(val : string) { this._str = val; this._has_str = true; }
+    set str(val : string) { this._str = val; this._has_str = true; this._dirty_str = true; }
     optInt: number | null; // 
     list: Array<string>; // 
     myEnum: NotifyEnum | null; // 
@@ -671,7 +769,7 @@ export class NotifyRecord
         obj.list = listFromJson(json['list'], el1 => <string>el1);
         obj.myEnum = jsonHasValue(json, 'my_enum') ? NotifyEnumFromString(json['my_enum']) : null;
         obj.value = <boolean>json['value'];
-        if ('str' in json) obj.str = <string>json['str'];
+        if ('str' in json) { obj._str = <string>json['str']; obj._has_str = true; }
         return obj;
     }
 
@@ -696,8 +794,21 @@ export class NotifyRecord
         res.list = this.list == null ? null : listClone(this.list, el1 => stringClone(el1));
         res.myEnum = this.myEnum == null ? null : this.myEnum;
         res.value = this.value == null ? null : this.value;
+        res._dirty_str = this._dirty_str;
         return res;
     }
+
+    toPatchJson(): Object
+    {
+        let obj: Object = {};
+        if (this._dirty_str) obj['str'] = this.str;
+        return obj;
+    }
+
+    markClean(): void
+    {
+        this._dirty_str = false;
+    }
 }
 
 export class NotifyData2
@@ -732,4 +843,20 @@ export class NotifyData2
         res.data = this.data == null ? null : this.data.clone();
         return res;
     }
+
+    toPatchJson(): Object
+    {
+        let obj: Object = {};
+        if (this.data != null)
+        {
+            let patch = this.data.toPatchJson();
+            if (Object.keys(patch).length > 0) obj['data'] = patch;
+        }
+        return obj;
+    }
+
+    markClean(): void
+    {
+        if (this.data != null) this.data.markClean();
+    }
 }
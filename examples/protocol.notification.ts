@@ -12,45 +12,101 @@ export class ProtocolNotification
 
 export class NotifyData1Notification extends ProtocolNotification
 {
-    payload: Protocol.NotifyRecord;
+    private _json: Object;
+    private _payload: Protocol.NotifyRecord;
     
     constructor(json: Object)
     {
         super(json['kind']);
-        this.payload = Protocol.NotifyRecord.fromJson(json['payload']);
+        this._json = json;
+    }
+
+    // decoded on first access
+    get payload(): Protocol.NotifyRecord
+    {
+        if (this._json !== null)
+        {
+            let json = this._json;
+            this._json = null;
+            this._payload = Protocol.NotifyRecord.fromJson(json['payload']);
+        }
+        return this._payload;
+    }
+
+    set payload(value: Protocol.NotifyRecord)
+    {
+        this._json = null;
+        this._payload = value;
     }
 }
 
 export class NotifyData2Notification extends ProtocolNotification
 {
-    payload: Protocol.NotifyData2;
+    private _json: Object;
+    private _payload: Protocol.NotifyData2;
     
     constructor(json: Object)
     {
         super(json['kind']);
-        this.payload = Protocol.NotifyData2.fromJson(json['payload']);
+        this._json = json;
+    }
+
+    // decoded on first access
+    get payload(): Protocol.NotifyData2
+    {
+        if (this._json !== null)
+        {
+            let json = this._json;
+            this._json = null;
+            this._payload = Protocol.NotifyData2.fromJson(json['payload']);
+        }
+        return this._payload;
+    }
+
+    set payload(value: Protocol.NotifyData2)
+    {
+        this._json = null;
+        this._payload = value;
     }
 }
 
 export class NotifyData3Notification extends ProtocolNotification
 {
-    payload: number;
+    private _json: Object;
+    private _payload: number;
     
     constructor(json: Object)
     {
         super(json['kind']);
-        this.payload = <number>json['payload'];
+        this._json = json;
+    }
+
+    // decoded on first access
+    get payload(): number
+    {
+        if (this._json !== null)
+        {
+            let json = this._json;
+            this._json = null;
+            this._payload = <number>json['payload'];
+        }
+        return this._payload;
+    }
+
+    set payload(value: number)
+    {
+        this._json = null;
+        this._payload = value;
     }
 }
 
 export class NotifyEmptyNotification extends ProtocolNotification
 {
-    payload: any;
+    payload: any = null;
     
     constructor(json: Object)
     {
         super(json['kind']);
-        this.payload = null;
     }
 }
 
@@ -62,22 +118,38 @@ export abstract class ProtocolNotificationService
     notifyData3 = new Subject<NotifyData3Notification>();
     notifyEmpty = new Subject<NotifyEmptyNotification>();
 
+    private handlers = new Map<string, (message: Object) => void>([
+        ['diffrent_kind', message => this.dispatch(this.notifyData1, NotifyData1Notification, message)],
+        ['notify_data2', message => this.dispatch(this.notifyData2, NotifyData2Notification, message)],
+        ['notify_data3', message => this.dispatch(this.notifyData3, NotifyData3Notification, message)],
+        ['notify_empty', message => this.dispatch(this.notifyEmpty, NotifyEmptyNotification, message)]
+    ]);
+
     constructor() { }
 
     push(message: Object)
     {
-        switch (message['kind'])
-        {
-            case 'diffrent_kind': this.notifyData1.next(new NotifyData1Notification(message)); break;
-            case 'notify_data2': this.notifyData2.next(new NotifyData2Notification(message)); break;
-            case 'notify_data3': this.notifyData3.next(new NotifyData3Notification(message)); break;
-            case 'notify_empty': this.notifyEmpty.next(new NotifyEmptyNotification(message)); break;
-            default: this.unknown(message); break;
-        }
+        let handler = this.handlers.get(message['kind']);
+        if (handler !== undefined)
+            handler(message);
+        else
+            this.unknown(message);
+    }
+
+    pushBatch(messages: Object[])
+    {
+        for (let message of messages)
+            this.push(message);
     }
 
     unknown(message: Object)
     {
         console.log('Unknown notification', JSON.stringify(message));
     }
+
+    private dispatch<T>(subject: Subject<T>, notification: new (json: Object) => T, message: Object)
+    {
+        if (subject.observers.length > 0)
+            subject.next(new notification(message));
+    }
 }
@@ -2,8 +2,8 @@
 // Compiler version: igorc 0.2.2
 // DO NOT EDIT THIS FILE - it is machine generated
 
-import {Observable} from "rxjs/Rx";
-import {Response} from "@angular/http";
+import {Observable, Observer} from "rxjs/Rx";
+import {Response, ResponseOptions} from "@angular/http";
 import * as Protocol from "./protocol.data"
 
 export abstract class ProtocolService
@@ -15,10 +15,14 @@ export abstract class ProtocolService
     abstract delete(path: string, query: Object, body: Object): Observable<Response>;
     abstract post(path: string, query: Object, body: Object): Observable<Response>;
 
+    private getLogCache = new ServiceCache<Response>(30000, 50);
+
     // 
     getLog(someQ: string): Observable<Protocol.RecordSimple>
     {
-        return this.get('/api/log', {'some_q': someQ})
+        let path = '/api/log';
+        let query = {'some_q': someQ};
+        return this.getLogCache.get(path + '?' + JSON.stringify(query), () => this.get(path, query)
             .catch(response =>
             {
                 switch(response.status)
@@ -26,7 +30,7 @@ export abstract class ProtocolService
                     case 500: return Observable.throw(Protocol.SomeEnumFromString(response.json()));
                     default: return Observable.throw(response);
                 }
-            })
+            }))
             .map(response => Protocol.RecordSimple.fromJson(response.json()));
     }
 
@@ -62,3 +66,95 @@ export abstract class ProtocolService
     }
 
 }
+
+//  Calls made together at startup
+export class StartupBatch extends ProtocolService
+{
+    private queue: {method: string, path: string, query: Object, body: Object, observer: Observer<Response>}[] = [];
+
+    constructor(private transport: ProtocolService) { super(); }
+
+    get(path: string, query: Object): Observable<Response> { return this.call('GET', path, query, null); }
+    put(path: string, query: Object, body: Object): Observable<Response> { return this.call('PUT', path, query, body); }
+    delete(path: string, query: Object, body: Object): Observable<Response> { return this.call('DELETE', path, query, body); }
+    post(path: string, query: Object, body: Object): Observable<Response> { return this.call('POST', path, query, body); }
+
+    private call(method: string, path: string, query: Object, body: Object): Observable<Response>
+    {
+        return Observable.create((observer: Observer<Response>) =>
+        {
+            if (this.queue.length == 0)
+                setTimeout(() => this.flush(), 0);
+            let call = {method: method, path: path, query: query, body: body, observer: observer};
+            this.queue.push(call);
+            // unsubscribing before the flush takes the call out of the batch
+            return () =>
+            {
+                let i = this.queue.indexOf(call);
+                if (i >= 0)
+                    this.queue.splice(i, 1);
+            };
+        });
+    }
+
+    flush()
+    {
+        let calls = this.queue;
+        this.queue = [];
+        if (calls.length == 0)
+            return;
+        let body = calls.map(a => ({method: a.method, path: a.path, query: a.query, body: a.body}));
+        this.transport.post('/api/batch', {}, body).subscribe(response =>
+        {
+            let results = <Object[]>response.json();
+            calls.forEach((a, i) =>
+            {
+                let result = results[i];
+                if (result === undefined)
+                    return a.observer.error(response);
+                let reply = new Response(new ResponseOptions({status: result['status'], body: result['body'], url: a.path}));
+                if (reply.ok)
+                {
+                    a.observer.next(reply);
+                    a.observer.complete();
+                }
+                else
+                    a.observer.error(reply);
+            });
+        }, error => calls.forEach(a => a.observer.error(error)));
+    }
+}
+
+// responses are shared by calls with the same url and query while the request
+// is in flight and for ttl milliseconds after the response arrives; failed
+// requests are dropped, and the oldest entry goes once size entries are held
+export class ServiceCache<T>
+{
+    private entries = new Map<string, {expires: number, value: Observable<T>}>();
+
+    constructor(private ttl: number, private size: number) { }
+
+    get(key: string, request: () => Observable<T>): Observable<T>
+    {
+        let now = Date.now();
+        let entry = this.entries.get(key);
+        if (entry !== undefined && entry.expires > now)
+            return entry.value;
+        this.entries.delete(key);
+        if (this.entries.size >= this.size)
+            this.entries.delete(this.entries.keys().next().value);
+        let added: {expires: number, value: Observable<T>} = {expires: Infinity, value: null};
+        added.value = request()
+            .do(() => { added.expires = Date.now() + this.ttl; },
+                () => { if (this.entries.get(key) === added) this.entries.delete(key); })
+            .publishReplay(1)
+            .refCount();
+        this.entries.set(key, added);
+        return added.value;
+    }
+
+    clear()
+    {
+        this.entries.clear();
+    }
+}
@@ -1,3 +1,6 @@
 from .compiler import IgorCompiler
 from .parser import IgorParser
-from .generator_ts import IgorGeneratorTs
\ No newline at end of file
+from .generator_ts import IgorGeneratorTs, IgorStreamGeneratorTs
+from .generator_py import IgorGeneratorPy
+from .api import CompileResult, parse_sources, compile_sources
+from .compact import CompactCodec
@@ -0,0 +1,49 @@
+from .compiler import version, igor_info
+from .parser import IgorParser
+from .utils import *
+
+# in-memory compilation without argparse, printing or files
+# every call uses its own parser and generator state, so calls are reentrant
+
+class CompileResult:
+    def __init__(self, schema, typescript, python=None):
+        self.schema = schema
+        self.typescript = typescript
+        self.python = python or {}
+
+    def schema_json(self, compact=False):
+        return json2str(self.schema, compact)
+
+def parse_groups(sources, engine='pypeg2'):
+    if isinstance(sources, str):
+        sources = {'<string>': sources}
+    groups = []
+    for name, text in sources.items():
+        p = IgorParser(engine)
+        if not p.parse_text(text, name):
+            raise p.error
+        groups.append((name, p.data))
+    return groups
+
+def parse_sources(sources, engine='pypeg2'):
+    return [a for name, data in parse_groups(sources, engine) for a in data]
+
+def generate_typescript(schema, layout='single', groups=None, codec='helpers', records='mutable', compact=False):
+    from .generator_ts import IgorGeneratorTs
+    ts = IgorGeneratorTs(schema, verbose=False, codec=codec, records=records, compact=compact)
+    prefix = igor_info.format(version=version)
+    files = {'protocol.data.ts': ts.generate_data()} if layout == 'single' else ts.generate_modules(layout, groups)
+    files['protocol.service.ts'] = ts.generate_service()
+    files['protocol.notification.ts'] = ts.generate_notification()
+    return {k: prefix + v for k, v in files.items()}
+
+def generate_python(schema):
+    from .generator_py import IgorGeneratorPy
+    return {'protocol.py': igor_info.format(version=version).replace('//', '#') + IgorGeneratorPy(schema, verbose=False).generate()}
+
+def compile_sources(sources, engine='pypeg2', typescript=True, layout='single', codec='helpers', records='mutable', compact=False, python=False):
+    groups = parse_groups(sources, engine)
+    schema = [a for name, data in groups for a in data]
+    return CompileResult(schema,
+        generate_typescript(schema, layout, groups, codec, records, compact) if typescript else {},
+        generate_python(schema) if python else {})
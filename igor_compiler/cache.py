@@ -0,0 +1,58 @@
+import os, hashlib
+from .utils import *
+
+# bumped whenever the parsers change the schema they produce, entries made by
+# the same compiler version but an older parser are never read back
+schema_format = 2
+
+class ParseCache:
+    def __init__(self, path, version, max_size=64 * 1024 * 1024):
+        self.path = path
+        self.version = version
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, text, engine):
+        h = hashlib.sha256()
+        h.update('{0}\n{1}\n{2}\n'.format(self.version, schema_format, engine).encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        path = self.filename(key)
+        try:
+            data = str2json(read_file(path))
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        write_file_atomic(self.filename(key), json2str(data, True))
+
+    def entries(self):
+        res = []
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                st = os.stat(os.path.join(self.path, name))
+                res.append((st.st_mtime, st.st_size, name))
+        return res
+
+    def evict(self):
+        entries = sorted(self.entries())
+        size = sum(a[1] for a in entries)
+        for mtime, length, name in entries:
+            if size <= self.max_size:
+                break
+            os.remove(os.path.join(self.path, name))
+            size -= length
+
+    def report(self):
+        return 'cache: {s.hits} hits, {s.misses} misses'.format(s=self)
@@ -0,0 +1,112 @@
+from .utils import *
+
+# python side of the generated toCompact/fromCompact codecs, driven by schema.json
+# values are in their json form (records as dicts, enums as strings, Date as
+# seconds); the compact form has records as arrays of their fields in
+# declaration order followed by a bit mask of the @property fields present,
+# and enums as ordinals with 0 for null
+
+def identity(value):
+    return value
+
+class CompactCodec:
+    def __init__(self, schema):
+        self.enums = {a['name']: a for a in schema if a['tag'] == 'enum'}
+        self.records = {a['name']: a for a in schema if a['tag'] == 'record'}
+        self.encoders = {}
+        self.decoders = {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(str2json(read_file(path)))
+
+    def encode(self, type, value):
+        return self.encoder(type)(value)
+
+    def decode(self, type, data):
+        return self.decoder(type)(data)
+
+    # type is a schema type or a definition name
+    def encoder(self, type):
+        if isinstance(type, str):
+            return self.ref(type, self.encoders, self.enum_encoder, self.record_encoder)
+        if type['tag'] == 'list':
+            item = self.encoder(type['item_type'])
+            return lambda value: [item(a) for a in value]
+        if type['tag'] == 'dict':
+            item = self.encoder(type['value_type'])
+            return lambda value: {k: item(a) for k, a in value.items()}
+        if type['tag'] == 'ref':
+            return self.encoder(type['ref'])
+        return identity
+
+    def decoder(self, type):
+        if isinstance(type, str):
+            return self.ref(type, self.decoders, self.enum_decoder, self.record_decoder)
+        if type['tag'] == 'list':
+            item = self.decoder(type['item_type'])
+            return lambda data: [item(a) for a in data]
+        if type['tag'] == 'dict':
+            item = self.decoder(type['value_type'])
+            return lambda data: {k: item(a) for k, a in data.items()}
+        if type['tag'] == 'ref':
+            return self.decoder(type['ref'])
+        return identity
+
+    def ref(self, name, cache, enum, record):
+        if name not in cache:
+            if name in self.enums:
+                cache[name] = enum(self.enums[name])
+            elif name in self.records:
+                # recursive records reach themselves through the cache
+                cache[name] = lambda value: cache[name](value)
+                cache[name] = record(self.records[name])
+            else:
+                raise GenerationError('unknown type ref ' + name)
+        return cache[name]
+
+    def enum_encoder(self, enum):
+        ordinals = {}
+        for i, a in enumerate(enum['items']):
+            ordinals.setdefault(a['name'], i + 1)
+        return lambda value: ordinals.get(value, 0)
+
+    def enum_decoder(self, enum):
+        names = [None] + [a['name'] for a in enum['items']]
+        return lambda data: names[data] if data != None and 0 < data < len(names) else None
+
+    def fields(self, record, coder):
+        properties = [a['name'] for a in record['items'] if a['property']]
+        if len(properties) > 31:
+            raise GenerationError('too many @property fields for the compact codec in ' + record['name'])
+        bits = {name: 1 << i for i, name in enumerate(properties)}
+        return [(a['name'], coder(a['type']), bits.get(a['name'])) for a in record['items']], bits
+
+    def record_encoder(self, record):
+        fields, bits = self.fields(record, self.encoder)
+        def encode(value):
+            res = []
+            mask = 0
+            for name, item, bit in fields:
+                if bit != None and name in value:
+                    mask |= bit
+                a = value.get(name)
+                res.append(None if a == None else item(a))
+            if bits:
+                res.append(mask)
+            return res
+        return encode
+
+    def record_decoder(self, record):
+        fields, bits = self.fields(record, self.decoder)
+        mask_index = len(fields)
+        def decode(data):
+            res = {}
+            mask = data[mask_index] if bits else 0
+            for i, (name, item, bit) in enumerate(fields):
+                if bit != None and not mask & bit:
+                    continue
+                a = data[i]
+                res[name] = None if a == None else item(a)
+            return res
+        return decode
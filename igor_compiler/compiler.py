@@ -1,17 +1,32 @@
-import os, sys, argparse, glob
-from .parser import IgorParser
-from .generator_ts import IgorGeneratorTs
+import os, sys, time, argparse, glob
+from .output import OutputWriter
+from .profiler import Profiler
 from .utils import *
 
+# parser, generators, cache and watcher are imported when the options need them
+
+version = "0.2.2"
+
 igor_info = '''// Author: Igor light compiler
 // Compiler version: igorc {version}
 // DO NOT EDIT THIS FILE - it is machine generated
 '''
 
+def parse_job(engine, text, filename):
+    from .parser import IgorParser
+    p = IgorParser(engine)
+    if p.parse_text(text, filename):
+        return p.data, None
+    return None, (p.error.msg, p.error.lineno, p.error.offset, p.error.text)
+
 class IgorCompiler:
     def __init__(self):
-        self.version = "0.2.2"
+        self.version = version
         self.data = []
+        self.groups = []
+        self.sources = {}
+        self.output = OutputWriter()
+        self.profiler = Profiler()
         self.args = None
     
     def parse_args(self):
@@ -21,34 +36,131 @@ class IgorCompiler:
 
         parser.add_argument('igor', nargs='*', help='input igor file')
         parser.add_argument('-t', '--typescript', help='genereate typescript folder')
+        parser.add_argument('-y', '--python', help='generate python data model folder')
         parser.add_argument('-s', '--schema', help='generate json schema file')
         parser.add_argument('-c', '--json-compact', action='store_true', help='compact schema json')
+        parser.add_argument('-p', '--parser', choices=['pypeg2', 'native'], default='pypeg2', help='parser engine')
+        parser.add_argument('--cache-dir', help='parse cache folder')
+        parser.add_argument('--cache-size', type=int, default=64, help='parse cache size limit in megabytes')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='parse files in parallel processes')
+        parser.add_argument('-m', '--manifest', help='generated files manifest, unchanged outputs are not rewritten')
+        parser.add_argument('-w', '--watch', action='store_true', help='stay resident and recompile on change')
+        parser.add_argument('--watch-delay', type=float, default=0.3, help='watch debounce delay in seconds')
+        parser.add_argument('-l', '--layout', choices=['single', 'definition', 'file'], default='single', help='typescript data layout: one protocol.data.ts, a module per\nenum/record or a module per igor file, with an index barrel')
+        parser.add_argument('--json-codec', choices=['helpers', 'inline'], default='helpers', help='typescript fromJson/toJson through the generic helpers or\nspecialized loops without callbacks')
+        parser.add_argument('--records', choices=['mutable', 'immutable'], default='mutable', help='typescript records with public fields and deep clone() or\nreadonly fields with copy-on-write with...() methods')
+        parser.add_argument('--compact-codec', action='store_true', help='also generate toCompact/fromCompact positional array codecs\n(see igor_compiler.compact for the python side)')
+        parser.add_argument('--stream', action='store_true', help='stream definitions through to the outputs with bounded memory\n(native parser, no cache or jobs)')
+        parser.add_argument('--profile', action='store_true', help='print time and peak memory of each parse, generate and write step\n(gen+write rows are outputs emitted straight to their file)')
+        parser.add_argument('--profile-top', type=int, default=0, help='also run cProfile and print the N hottest functions')
+        parser.add_argument('--profile-json', help='save profile results to json file')
+        parser.add_argument('--server', action='store_true', help='serve json-rpc compile requests on stdin/stdout')
         parser.add_argument('-v', '--version', action='store_true', help='compiler version')
         
         self.args = parser.parse_args()
+        if self.args.stream and self.args.parser != 'native':
+            parser.error('--stream needs the native parser (-p native)')
+        if self.args.stream and (self.args.jobs > 1 or self.args.cache_dir != None):
+            parser.error('--stream can not be combined with --jobs or --cache-dir')
+        if self.args.stream and self.args.watch:
+            parser.error('--stream can not be combined with --watch')
+        if self.args.stream and self.args.python != None:
+            parser.error('--stream does not generate python')
+        if self.args.stream and self.args.layout != 'single':
+            parser.error('--stream only supports the single layout')
         if self.args.version:
             print(self.version)
             return False
-        if self.args.igor == []:
+        if self.args.igor == [] and not self.args.server:
             parser.print_help()
             return False
+        self.profiler = Profiler(self.args.profile or self.args.profile_json != None, self.args.profile_top)
         return True
 
     def save(self, path, compact=False):
-        write_file(path, json2str(self.data, compact))
+        with self.profiler.measure('generate', path):
+            text = json2str(self.data, compact)
+        self.write(path, text)
+
+    def write(self, path, text):
+        with self.profiler.measure('write', path):
+            self.output.write(path, text)
 
     def files(self):
         return [f for g in self.args.igor for f in glob.glob(g)]
 
-    def run(self):
-        p = IgorParser()
-        for f in self.files():
+    def parse(self, p, cache, f):
+        if cache == None:
             print('parse: ' + f)
-            if not p.parse(f):
-               p.print_error()
-               return
-            self.data += p.data
-        
+            return p.parse(f)
+        text = read_file(f)
+        key = cache.key(text, p.engine)
+        data = cache.get(key)
+        if data != None:
+            print('cached: ' + f)
+            p.data = data
+            return True
+        print('parse: ' + f)
+        if not p.parse_text(text, f):
+            return False
+        cache.put(key, p.data)
+        return True
+
+    def parse_serial(self, p, cache, files):
+        for f in files:
+            with self.profiler.measure('parse', f):
+                ok = self.parse(p, cache, f)
+            if not ok:
+                return False
+            self.sources[f] = p.data
+        return True
+
+    def parse_parallel(self, p, cache, files):
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(self.args.jobs) as pool:
+            jobs = []
+            for f in files:
+                text = read_file(f)
+                key = cache.key(text, p.engine) if cache != None else None
+                data = cache.get(key) if cache != None else None
+                future = pool.submit(parse_job, p.engine, text, f) if data == None else None
+                jobs.append((f, key, data, future))
+            for f, key, data, future in jobs:
+                if future == None:
+                    print('cached: ' + f)
+                else:
+                    print('parse: ' + f)
+                    data, error = future.result()
+                    if error != None:
+                        p.error = SyntaxError(error[0], (f,) + error[1:])
+                        for a in jobs:
+                            if a[3] != None:
+                                a[3].cancel()
+                        return False
+                    if cache != None:
+                        cache.put(key, data)
+                self.sources[f] = data
+        return True
+
+    def compile(self, p, cache, files):
+        dirty = [f for f in dict.fromkeys(files) if f not in self.sources]
+        if self.args.jobs > 1 and len(dirty) > 1:
+            with self.profiler.measure('parse', '{0} files, {1} jobs'.format(len(dirty), self.args.jobs)):
+                ok = self.parse_parallel(p, cache, dirty)
+        else:
+            ok = self.parse_serial(p, cache, dirty)
+        if not ok:
+            p.print_error()
+            return False
+
+        if cache != None:
+            cache.evict()
+            print(cache.report())
+
+        self.data = [a for f in files for a in self.sources[f]]
+        self.groups = [(f, self.sources[f]) for f in files]
+        self.output = OutputWriter(self.args.manifest)
+
         if self.args.schema != None:
             print('save schema...')
             self.save(self.args.schema, self.args.json_compact)
@@ -60,15 +172,177 @@ class IgorCompiler:
             except GenerationError as e:
                 print(e)
 
-        print("DONE")
-            
-    def gen_ts(self):
+        if self.args.python != None:
+            print('generate python...')
+            try:
+                self.gen_py()
+            except GenerationError as e:
+                print(e)
+
+        self.output.save()
+        print(self.output.report())
+        return True
+
+    def definitions(self, p, log=True):
+        for f in self.files():
+            if log:
+                print('parse: ' + f)
+            yield from p.stream(f)
+
+    def compile_stream(self, p):
+        from .generator_ts import IgorStreamGeneratorTs
+        self.output = OutputWriter(self.args.manifest)
+        ts = IgorStreamGeneratorTs(self.args.json_codec, self.args.records, self.args.compact_codec)
+        definitions = ts.collect(self.definitions(p))
+        try:
+            with self.profiler.measure('stream', self.args.schema or 'parse'):
+                if self.args.schema != None:
+                    print('save schema...')
+                    with self.output.open(self.args.schema) as f:
+                        for text in json_chunks(definitions, self.args.json_compact):
+                            f.write(text)
+                else:
+                    for a in definitions:
+                        pass
+
+            if self.args.typescript != None:
+                print('generate typescript...')
+                ts.print_declarations()
+                try:
+                    with self.profiler.measure('stream', self.args.typescript):
+                        self.gen_ts_stream(p, ts)
+                except GenerationError as e:
+                    print(e)
+        except SyntaxError as err:
+            p.error = err
+            p.print_error()
+            return False
+
+        self.output.save()
+        print(self.output.report())
+        return True
+
+    def serve(self):
+        from .server import IgorServer
+        server = IgorServer(self.args.parser, self.args.schema, self.args.typescript, self.args.json_compact, self.args.manifest,
+                            self.args.layout, self.args.json_codec, self.args.records, self.args.compact_codec, self.args.python)
+        for f in self.files():
+            server.update_file(f)
+        server.serve()
+
+    def run(self):
+        if self.args.server:
+            self.serve()
+            return
+        self.profiler.start()
+        try:
+            self.build()
+        finally:
+            self.profiler.stop()
+            self.profile_report()
+
+    def profile_report(self):
+        if not self.profiler.enabled:
+            return
+        print(self.profiler.report())
+        if self.args.profile_json != None:
+            write_file(self.args.profile_json, json2str(self.profiler.to_json()))
+
+    def build(self):
+        from .parser import IgorParser
+        p = IgorParser(self.args.parser)
+        if self.args.stream:
+            if self.compile_stream(p):
+                print("DONE")
+            return
+        cache = None
+        if self.args.cache_dir != None:
+            from .cache import ParseCache
+            cache = ParseCache(self.args.cache_dir, self.version, self.args.cache_size * 1024 * 1024)
+        if self.compile(p, cache, self.files()):
+            print("DONE")
+        elif self.args.watch:
+            print("FAILED, fix the errors to rebuild")
+        if self.args.watch:
+            self.watch(p, cache)
+
+    def watch(self, p, cache):
+        from .watch import Watcher
+        watcher = Watcher(self.args.igor, self.args.watch_delay)
+        print('watching ({0})...'.format(watcher.mode))
+        try:
+            while True:
+                changed = watcher.wait()
+                start = time.perf_counter()
+                files = self.files()
+                self.sources = {f: self.sources[f] for f in files if f in self.sources and f not in changed}
+                count = len(set(files) - set(self.sources))
+                if self.compile(p, cache, files):
+                    print('rebuilt {0} of {1} files in {2:.3f}s'.format(count, len(set(files)), time.perf_counter() - start))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+    def ts_paths(self):
         target_dir = self.args.typescript
         target_data_path = 'protocol.data.ts'
         target_service_path = 'protocol.service.ts'
         target_notification_path = 'protocol.notification.ts'
-        ts = IgorGeneratorTs(self.data)
+        return [os.path.join(target_dir, a) for a in [target_data_path, target_service_path, target_notification_path]]
+
+    def gen_ts(self):
+        from .generator_ts import IgorGeneratorTs
+        from .emitter import Emitter
+        data_path, service_path, notification_path = self.ts_paths()
+        with self.profiler.measure('generate', 'symbols'):
+            ts = IgorGeneratorTs(self.data, codec=self.args.json_codec, records=self.args.records, compact=self.args.compact_codec)
+        prefix = igor_info.format(version=self.version);
+        outputs = [(data_path, ts.emit_data), (service_path, ts.emit_service), (notification_path, ts.emit_notification)]
+        if self.args.layout != 'single':
+            outputs = self.ts_modules(ts) + outputs[1:]
+        for path, emit in outputs:
+            # emitted straight into the output, so the row covers writing too
+            with self.profiler.measure('gen+write', path), self.output.open(path) as f, Emitter(f) as out:
+                out.write(prefix)
+                emit(out)
+        if self.args.layout != 'single':
+            self.remove_stale_modules([path for path, emit in outputs])
+
+    def ts_modules(self, ts):
+        from .generator_ts import modules_folder, helpers_path
+        folder = os.path.join(self.args.typescript, modules_folder)
+        os.makedirs(folder, exist_ok=True)
+        modules = ts.data_modules(self.args.layout, self.groups)
+        owners = ts.module_owners(modules)
+        outputs = [(os.path.join(self.args.typescript, helpers_path), ts.emit_helpers)]
+        for a in modules:
+            outputs.append((os.path.join(self.args.typescript, a.path), lambda out, a=a: ts.emit_module(out, a, owners)))
+        outputs.append((self.ts_paths()[0], lambda out: ts.emit_index(out, modules)))
+        return outputs
+
+    # modules of definitions that no longer exist, only files we generated
+    def remove_stale_modules(self, paths):
+        from .generator_ts import modules_folder
+        head = igor_info.split('\n')[0]
+        for path in glob.glob(os.path.join(self.args.typescript, modules_folder, '*.ts')):
+            if path not in paths and read_file(path).startswith(head):
+                self.output.remove(path)
+
+    def gen_py(self):
+        from .generator_py import IgorGeneratorPy
+        from .emitter import Emitter
+        path = os.path.join(self.args.python, 'protocol.py')
+        with self.profiler.measure('generate', 'python symbols'):
+            py = IgorGeneratorPy(self.data)
+        with self.profiler.measure('gen+write', path), self.output.open(path) as f, Emitter(f) as out:
+            out.write(igor_info.format(version=self.version).replace('//', '#'))
+            py.emit(out)
+
+    def gen_ts_stream(self, p, ts):
+        data_path, service_path, notification_path = self.ts_paths()
         prefix = igor_info.format(version=self.version);
-        write_file(os.path.join(target_dir, target_data_path), prefix + ts.generate_data())
-        write_file(os.path.join(target_dir, target_service_path), prefix + ts.generate_service())
-        write_file(os.path.join(target_dir, target_notification_path), prefix + ts.generate_notification())
+        with self.output.open(data_path) as data, self.output.open(service_path) as service, self.output.open(notification_path) as notification:
+            for f in [data, service, notification]:
+                f.write(prefix)
+            ts.generate(self.definitions(p, False), data, service, notification)
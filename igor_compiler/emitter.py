@@ -0,0 +1,54 @@
+import io
+
+# filled up front and never grown, so concurrent emitters can share it
+indents = ['    ' * i for i in range(32)]
+
+def indent(level):
+    return indents[level] if level < len(indents) else '    ' * level
+
+class Emitter:
+    def __init__(self, stream, size=1 << 12):
+        self.stream = stream
+        self.size = size
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+        if len(self.chunks) >= self.size:
+            self.flush()
+
+    def line(self, level, text=''):
+        chunks = self.chunks
+        chunks.append(indents[level] if level < len(indents) else indent(level))
+        chunks.append(text)
+        chunks.append('\n')
+        if len(chunks) >= self.size:
+            self.flush()
+
+    # an empty block still leaves its blank line, as the joined templates did
+    def block(self, level, lines, sep=''):
+        lines = list(lines)
+        if not lines:
+            self.write('\n')
+        for a in lines[:-1]:
+            self.line(level, a + sep)
+        if lines:
+            self.line(level, lines[-1])
+
+    def flush(self):
+        if self.chunks:
+            self.stream.write(''.join(self.chunks))
+            self.chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type == None:
+            self.flush()
+
+def render(emit, *args):
+    stream = io.StringIO()
+    with Emitter(stream) as out:
+        emit(out, *args)
+    return stream.getvalue()
@@ -0,0 +1,388 @@
+import keyword
+from .utils import *
+from .ir import IrSchema
+from .emitter import render
+
+# python data model: IntEnum per enum, __slots__ class per record with
+# from_json/to_json spelled out per field, Date as seconds like the ts side;
+# validate_* functions check json values before decoding, flattened per
+# record and per service request so no schema is walked at runtime; url
+# params and query values are checked as the text they arrive in
+
+header = r'''
+import enum
+from datetime import datetime as _datetime, timezone as _timezone
+from math import ceil as _ceil
+from re import compile as _regex
+
+_property = property
+_numbers = (int, float)
+_int_text = _regex(r'[-+]?[0-9]+\Z').match
+_number_text = _regex(r'[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\Z').match
+
+class ValidationError(ValueError):
+    def __init__(self, message):
+        ValueError.__init__(self, message)
+        self.message = message
+        self.path = []
+
+    # keys are prepended while the error unwinds through the validators
+    def at(self, key):
+        self.path.insert(0, key)
+        return self
+
+    def __str__(self):
+        path = ''.join(['[{0}]'.format(a) if type(a) is int else '.' + a for a in self.path]).lstrip('.')
+        return path + ': ' + self.message if path else self.message
+'''
+
+simple_checks = {
+    'int': 'type({0}) is not int',
+    'number': 'type({0}) not in _numbers',
+    'Date': 'type({0}) not in _numbers',
+    'string': 'type({0}) is not str',
+    'bool': 'type({0}) is not bool',
+}
+
+text_checks = {
+    'int': 'type({0}) is not str or not _int_text({0})',
+    'number': 'type({0}) is not str or not _number_text({0})',
+    'Date': 'type({0}) is not str or not _number_text({0})',
+    'string': 'type({0}) is not str',
+    'bool': "{0} != 'true' and {0} != 'false'",
+}
+
+# a field named like the generated methods or the self argument is mangled too
+reserved_names = ('self', 'from_json', 'to_json')
+
+def attr_name(name):
+    return name + '_' if keyword.iskeyword(name) or name in reserved_names else name
+
+def member_name(name):
+    return underscore(name).upper()
+
+def comment(text):
+    return '#' + text.replace('\n', '\n#')
+
+def emit_comment(out, level, text):
+    if text.strip():
+        out.block(level, comment(text).split('\n'))
+
+class PyType:
+    def __init__(self, ir):
+        self.ir = ir
+        self.item = PyType(ir.item) if ir.item != None else None
+
+    @property
+    def is_identity(self):
+        if self.ir.is_list or self.ir.is_dict: return False
+        return not self.ir.is_ref and self.ir.tag != 'Date'
+
+    @property
+    def el(self): return 'el' + str(self.ir.depth)
+
+    @property
+    def key(self): return 'key' + str(self.ir.depth)
+
+    def from_json(self, json):
+        ir = self.ir
+        if ir.is_record: return '{0}.from_json({1})'.format(ir.ref, json)
+        elif ir.is_enum: return '_{0}_values.get({1})'.format(ir.ref, json)
+        elif ir.is_list and self.item.is_identity: return 'list({0})'.format(json)
+        elif ir.is_list: return '[{0} for {1} in {2}]'.format(self.item.from_json(self.el), self.el, json)
+        elif ir.is_dict and self.item.is_identity: return 'dict({0})'.format(json)
+        elif ir.is_dict: return '{{{k}: {0} for {k}, {1} in {2}.items()}}'.format(self.item.from_json(self.el), self.el, json, k=self.key)
+        elif ir.tag == 'Date': return '_datetime.fromtimestamp({0}, _timezone.utc)'.format(json)
+        elif ir.is_simple: return json
+        else: raise GenerationError('unknown type ' + ir.tag)
+
+    @property
+    def is_checked(self): return self.ir.tag != 'json'
+
+    # statements raising ValidationError unless var holds this type in json form
+    def emit_check(self, out, level, var):
+        ir = self.ir
+        if ir.is_record:
+            out.line(level, 'validate_{0}({1})'.format(ir.ref, var))
+        elif ir.is_enum:
+            out.line(level, 'if type({0}) is not str or {0} not in _{1}_values:'.format(var, ir.ref))
+            out.line(level + 1, "raise ValidationError('{0} expected')".format(ir.ref))
+        elif ir.is_list or ir.is_dict:
+            kind = 'list' if ir.is_list else 'dict'
+            out.line(level, 'if type({0}) is not {1}:'.format(var, kind))
+            out.line(level + 1, "raise ValidationError('{0} expected')".format(kind))
+            if self.item.is_checked:
+                loop = 'enumerate({0})' if ir.is_list else '{0}.items()'
+                out.line(level, 'try:')
+                out.line(level + 1, 'for {0}, {1} in {2}:'.format(self.key, self.el, loop.format(var)))
+                self.item.emit_check(out, level + 2, self.el)
+                out.line(level, 'except ValidationError as e:')
+                out.line(level + 1, 'raise e.at({0})'.format(self.key))
+        elif ir.tag in simple_checks:
+            out.line(level, 'if {0}:'.format(simple_checks[ir.tag].format(var)))
+            out.line(level + 1, "raise ValidationError('{0} expected')".format(ir.tag))
+        elif ir.tag != 'json':
+            raise GenerationError('unknown type ' + ir.tag)
+
+    def emit_text_check(self, out, level, var):
+        if self.ir.is_enum:
+            return self.emit_check(out, level, var)
+        tag = self.ir.tag if self.ir.tag in text_checks else 'string'
+        out.line(level, 'if {0}:'.format(text_checks[tag].format(var)))
+        out.line(level + 1, "raise ValidationError('{0} text expected')".format(tag))
+
+    def to_json(self, var):
+        ir = self.ir
+        if ir.is_record: return '{0}.to_json()'.format(var)
+        elif ir.is_enum: return '_{0}_strings[{1}]'.format(ir.ref, var)
+        elif ir.is_list and self.item.is_identity: return 'list({0})'.format(var)
+        elif ir.is_list: return '[{0} for {1} in {2}]'.format(self.item.to_json(self.el), self.el, var)
+        elif ir.is_dict and self.item.is_identity: return 'dict({0})'.format(var)
+        elif ir.is_dict: return '{{{k}: {0} for {k}, {1} in {2}.items()}}'.format(self.item.to_json(self.el), self.el, var, k=self.key)
+        elif ir.tag == 'Date': return '_ceil({0}.timestamp())'.format(var)
+        elif ir.is_simple: return var
+        else: raise GenerationError('unknown type ' + ir.tag)
+
+# checks one named member of a json dict; @property fields may be left out
+def emit_member_check(out, level, type, name, optional, property):
+    out.line(level, "field = '{0}'".format(name))
+    if optional and not type.is_checked:
+        return
+    out.line(level, "v = value.get('{0}')".format(name))
+    if optional:
+        out.line(level, 'if v is not None:')
+        type.emit_check(out, level + 1, 'v')
+        return
+    out.line(level, 'if v is None:')
+    if property:
+        out.line(level + 1, "if '{0}' in value:".format(name))
+        out.line(level + 2, "raise ValidationError('required')")
+        if type.is_checked:
+            out.line(level, 'else:')
+            type.emit_check(out, level + 1, 'v')
+    else:
+        out.line(level + 1, "raise ValidationError('required')")
+        type.emit_check(out, level, 'v')
+
+class PyEnum:
+    def __init__(self, ir):
+        self.ir = ir
+
+    @property
+    def name(self): return self.ir.name
+
+    def emit(self, out):
+        name = self.name
+        # the first item of a name wins, like in the index
+        items = []
+        ordinals = {}
+        for i, a in enumerate(self.ir.items):
+            if a.name not in ordinals:
+                ordinals[a.name] = i + 1
+                items.append(a)
+        out.write('\n')
+        out.line(0, 'class {0}(enum.IntEnum):'.format(name))
+        emit_comment(out, 1, self.ir.description)
+        if not items:
+            out.line(1, 'pass')
+        for a in items:
+            line = '{0} = {1}'.format(member_name(a.name), ordinals[a.name])
+            if a.description.strip():
+                line += ' ' + comment(a.description.replace('\n', ' '))
+            out.line(1, line)
+        out.line(0)
+        out.line(0, '_{0}_values = {{'.format(name))
+        out.block(1, ["'{0}': {1}.{2}".format(a.name, name, member_name(a.name)) for a in items], ',')
+        out.line(0, '}')
+        out.line(0, '_{0}_strings = {{v: k for k, v in _{0}_values.items()}}'.format(name))
+
+class PyField:
+    def __init__(self, ir):
+        self.ir = ir
+        self.type = PyType(ir.type)
+
+    @property
+    def name(self): return self.ir.name
+
+    @property
+    def attr(self): return attr_name(self.ir.name)
+
+    @property
+    def private_attr(self): return '_' + self.ir.name
+
+    @property
+    def has_attr(self): return '_has_' + self.ir.name
+
+    @property
+    def slots(self):
+        if self.ir.property:
+            return [self.private_attr, self.has_attr]
+        return [self.attr]
+
+    def value_to_json(self, var):
+        if self.ir.optional and not self.type.is_identity:
+            return 'None if {0} is None else {1}'.format(var, self.type.to_json(var))
+        return self.type.to_json(var)
+
+    def emit_init(self, out):
+        if self.ir.property:
+            out.line(2, 'self.{0} = {1}'.format(self.private_attr, self.attr))
+            out.line(2, 'self.{0} = {1} is not None'.format(self.has_attr, self.attr))
+        else:
+            out.line(2, 'self.{0} = {0}'.format(self.attr))
+
+    def emit_property(self, out):
+        out.line(0)
+        out.line(1, 'def _get_{0}(self):'.format(self.name))
+        out.line(2, 'return self.{0}'.format(self.private_attr))
+        out.line(0)
+        out.line(1, 'def _set_{0}(self, value):'.format(self.name))
+        out.line(2, 'self.{0} = value'.format(self.private_attr))
+        out.line(2, 'self.{0} = True'.format(self.has_attr))
+        out.line(0)
+        out.line(1, '{0} = _property(_get_{1}, _set_{1})'.format(self.attr, self.name))
+
+    def emit_from_json(self, out):
+        name = self.name
+        if self.ir.property:
+            out.line(2, "if '{0}' in json:".format(name))
+            target, level = self.private_attr, 3
+        else:
+            target, level = self.attr, 2
+        if self.ir.optional and not self.type.is_identity:
+            out.line(level, "value = json.get('{0}')".format(name))
+            out.line(level, 'obj.{0} = None if value is None else {1}'.format(target, self.type.from_json('value')))
+        elif self.ir.optional:
+            out.line(level, "obj.{0} = json.get('{1}')".format(target, name))
+        else:
+            out.line(level, "obj.{0} = {1}".format(target, self.type.from_json("json['{0}']".format(name))))
+        if self.ir.property:
+            out.line(3, 'obj.{0} = True'.format(self.has_attr))
+            out.line(2, 'else:')
+            out.line(3, 'obj.{0} = None'.format(self.private_attr))
+            out.line(3, 'obj.{0} = False'.format(self.has_attr))
+
+class PyRecord:
+    def __init__(self, ir):
+        self.ir = ir
+        self.fields = [PyField(a) for a in ir.fields]
+
+    @property
+    def name(self): return self.ir.name
+
+    def emit(self, out):
+        name = self.name
+        fields = [a for a in self.fields if not a.ir.property]
+        properties = [a for a in self.fields if a.ir.property]
+        attrs = [a.attr for a in self.fields]
+        if len(set(attrs)) != len(attrs):
+            raise GenerationError('fields of {0} clash once mangled: {1}'.format(name, ', '.join(a.name for a in self.fields)))
+        out.write('\n')
+        out.line(0, 'class {0}:'.format(name))
+        emit_comment(out, 1, self.ir.description)
+        out.line(1, '__slots__ = {0!r}'.format(tuple([s for a in self.fields for s in a.slots])))
+        out.line(0)
+        out.line(1, 'def __init__(self{0}):'.format(''.join([', {0}=None'.format(a.attr) for a in self.fields])))
+        for a in self.fields:
+            a.emit_init(out)
+        if not self.fields:
+            out.line(2, 'pass')
+        for a in properties:
+            a.emit_property(out)
+        out.line(0)
+        out.line(1, '@classmethod')
+        out.line(1, 'def from_json(cls, json):')
+        out.line(2, 'obj = cls.__new__(cls)')
+        for a in fields + properties:
+            a.emit_from_json(out)
+        out.line(2, 'return obj')
+        out.line(0)
+        out.line(1, 'def to_json(self):')
+        if fields:
+            out.line(2, 'obj = {')
+            out.block(3, ["'{0}': {1},".format(a.name, a.value_to_json('self.' + a.attr)) for a in fields])
+            out.line(2, '}')
+        else:
+            out.line(2, 'obj = {}')
+        for a in properties:
+            out.line(2, 'if self.{0}:'.format(a.has_attr))
+            out.line(3, "obj['{0}'] = {1}".format(a.name, a.value_to_json('self.' + a.private_attr)))
+        out.line(2, 'return obj')
+
+    def emit_validator(self, out):
+        out.line(0)
+        out.line(0, 'def validate_{0}(value):'.format(self.name))
+        out.line(1, 'if type(value) is not dict:')
+        out.line(2, "raise ValidationError('{0} expected')".format(self.name))
+        if not self.fields:
+            return
+        out.line(1, 'try:')
+        for a in self.fields:
+            emit_member_check(out, 2, a.type, a.name, a.ir.optional, a.ir.property)
+        out.line(1, 'except ValidationError as e:')
+        out.line(2, 'raise e.at(field)')
+
+class PyService:
+    def __init__(self, ir):
+        self.ir = ir
+        self.params = [(a.name, PyType(a.type)) for a in ir.params]
+        self.query = [(a.name, PyType(a.type)) for a in ir.query]
+        self.body = PyType(ir.body) if ir.body != None else None
+
+    @property
+    def name(self): return underscore(self.ir.name)
+
+    def emit_members(self, out, part, members):
+        out.line(1, 'if type({0}) is not dict:'.format(part))
+        out.line(2, "raise ValidationError('dict expected').at('{0}')".format(part))
+        out.line(1, 'try:')
+        for name, type in members:
+            out.line(2, "field = '{0}'".format(name))
+            out.line(2, "v = {0}.get('{1}')".format(part, name))
+            out.line(2, 'if v is None:')
+            out.line(3, "raise ValidationError('required')")
+            type.emit_text_check(out, 2, 'v')
+        out.line(1, 'except ValidationError as e:')
+        out.line(2, "raise e.at(field).at('{0}')".format(part))
+
+    def emit_validator(self, out):
+        out.line(0)
+        out.line(0, 'def validate_{0}_request(params=None, query=None, body=None):'.format(self.name))
+        if self.params:
+            self.emit_members(out, 'params', self.params)
+        if self.query:
+            self.emit_members(out, 'query', self.query)
+        if self.body != None:
+            out.line(1, 'if body is None:')
+            out.line(2, "raise ValidationError('required').at('body')")
+            if self.body.is_checked:
+                out.line(1, 'try:')
+                self.body.emit_check(out, 2, 'body')
+                out.line(1, 'except ValidationError as e:')
+                out.line(2, "raise e.at('body')")
+        if not self.params and not self.query and self.body == None:
+            out.line(1, 'pass')
+
+class IgorGeneratorPy:
+    def __init__(self, schema, verbose=True):
+        self.ir = IrSchema(schema)
+        self.enums = [PyEnum(a) for a in self.ir.enums]
+        self.records = [PyRecord(a) for a in self.ir.records]
+        self.services = [PyService(a) for a in self.ir.services]
+        if verbose:
+            print('Python: {0} enums, {1} records, {2} service validators'.format(len(self.enums), len(self.records), len(self.services)))
+
+    def emit(self, out):
+        self.ir.resolve()
+        out.write(header)
+        for a in self.enums:
+            a.emit(out)
+        for a in self.records:
+            a.emit(out)
+        for a in self.records:
+            a.emit_validator(out)
+        for a in self.services:
+            a.emit_validator(out)
+
+    def generate(self):
+        return render(self.emit)
@@ -1,5 +1,7 @@
-import json, inflection, io, os
+import json, io, os, re
 from .utils import *
+from .ir import IrBuilder, IrSchema
+from .emitter import Emitter, render
 
 # pip install inflection
 
@@ -76,18 +78,34 @@ function selectOptions(count: number, key: string, value: string, toValue: (data
     }
     return res;
 }
+
+function itemsChanged(data: any): boolean
+{
+    if (data == null)
+        return false;
+    if (typeof data.toPatchJson === 'function')
+        return Object.keys(data.toPatchJson()).length > 0;
+    for (let key in data)
+        if (itemsChanged(data[key]))
+            return true;
+    return false;
+}
+
+function markItemsClean(data: any): void
+{
+    if (data == null)
+        return;
+    if (typeof data.markClean === 'function')
+        data.markClean();
+    else
+        for (let key in data)
+            markItemsClean(data[key]);
+}
 '''
 
 def wrap(text, border="'"):
     return border + text + border
 
-def offset(count, text):
-    return '\n'.join([spaces(count) + a for a in text.split('\n')])
-
-def spaces(count):
-    if count > 0: return '    ' + spaces(count - 1)
-    else: return ''
-
 def load(path):
     with open(path, 'r', encoding='utf8') as f:
         return json.loads(f.read())
@@ -96,59 +114,182 @@ def save(path, text):
     with open(path, 'w', encoding='utf8') as f:
         f.write(text)
 
-global_prefix = ''
-global_enums = {}
-global_records = {}
-global_varname = 0
-    
+class Symbols:
+    def __init__(self, codec='helpers', records='mutable', compact=False):
+        self.prefix = ''
+        self.inline = codec == 'inline'
+        self.immutable = records == 'immutable'
+        self.compact = compact
+        self.codecs = Codecs()
+
+# inline codec functions of one output file in first use order; shapes with
+# the same name get a numbered suffix
+class Codecs:
+    def __init__(self):
+        self.items = []
+        self.names = {}
+        self.used = set()
+
+    def add(self, type, kind):
+        if type.key not in self.names:
+            taken = set(self.names.values())
+            base = name = camelize(type.shape, False)
+            suffix = 1
+            while name in taken:
+                suffix += 1
+                name = base + str(suffix)
+            self.names[type.key] = name
+        name = self.names[type.key] + kind
+        if name not in self.used:
+            self.used.add(name)
+            self.items.append((name, type, kind))
+        return name
+
+# immutable records hand out readonly lists and dicts, the helpers accept both
+readonly_helpers = [
+    ('function listToJson<T>(data: T[]', 'function listToJson<T>(data: ReadonlyArray<T>'),
+    ('function dictToJson<T>(data: {[key: string]: T}', 'function dictToJson<T>(data: {readonly [key: string]: T}'),
+    ('function dictClone<T>(data: {[key: string]: T}', 'function dictClone<T>(data: {readonly [key: string]: T}'),
+    ('function listClone<T>(data: T[]', 'function listClone<T>(data: ReadonlyArray<T>'),
+]
+
+def header_text(symbols):
+    text = header
+    if symbols.immutable:
+        for old, new in readonly_helpers:
+            text = text.replace(old, new)
+    return text
+
+# with the inline codec every list/dict shape used by a file gets its own
+# fromJson/toJson function with plain loops, emitted once at the end of the file
+def emit_codecs(out, symbols):
+    for name, type, kind in symbols.codecs.items:
+        out.line(0)
+        if kind == 'FromJson':
+            out.line(0, 'function {0}(json: any): {1}'.format(name, type.declaration))
+            out.line(0, '{')
+            type.emit_decode(out, 1, 'json', None)
+        else:
+            out.line(0, 'function {0}(data: {1}): any'.format(name, type.declaration))
+            out.line(0, '{')
+            type.emit_encode(out, 1, 'data', None)
+        out.line(0, '}')
+    symbols.codecs = Codecs()
+
 class Type:
-    def __init__(self, schema, index = 1):
-        self.schema = schema
-        self.index = index;
+    __slots__ = ('ir', 'symbols', 'item', 'declarations')
+
+    def __init__(self, ir, symbols):
+        self.ir = ir
+        self.symbols = symbols
+        self.item = Type(ir.item, symbols) if ir.item != None else None
+        self.declarations = {}
 
     @property
-    def is_ref(self): return self.tag == 'ref'
+    def is_ref(self): return self.ir.is_ref
     
     @property
-    def is_list(self): return self.tag == 'list'
+    def is_list(self): return self.ir.is_list
     
     @property
-    def is_dict(self): return self.tag == 'dict'
+    def is_dict(self): return self.ir.is_dict
     
     @property
-    def is_enum(self): return self.is_ref and self.ref in global_enums
+    def is_enum(self): return self.ir.is_enum
     
     @property
-    def is_record(self): return self.is_ref and self.ref in global_records
+    def is_record(self): return self.ir.is_record
     
     @property
-    def is_simple(self):
-        return self.tag in ['number', 'int', 'string', 'bool', 'json', 'Date']
+    def is_simple(self): return self.ir.is_simple
        
     @property
-    def tag(self): return self.schema['tag']
+    def tag(self): return self.ir.tag
     
     @property
-    def ref(self): return self.schema['ref']
+    def ref(self): return self.ir.ref
     
     @property
-    def fullref(self): return global_prefix + self.schema['ref']
+    def fullref(self): return self.symbols.prefix + self.ir.ref
     
     @property
-    def item_type(self):
-        return Type(self.schema['item_type'], self.index + 1)
+    def item_type(self): return self.item
     
     @property
-    def value_type(self):
-        return Type(self.schema['value_type'], self.index + 1)
+    def value_type(self): return self.item
     
+    @property
+    def shape(self):
+        if self.is_list: return 'Array' + self.item.shape
+        elif self.is_dict: return 'Dict' + self.item.shape
+        elif self.is_ref: return self.ref
+        else: return camelize(self.tag)
+
+    # the structure, unlike the shape it is unique per type
+    @property
+    def key(self):
+        if self.is_list or self.is_dict: return self.tag + '<' + self.item.key + '>'
+        elif self.is_ref: return self.ref
+        else: return self.tag
+
+    def codec(self, kind):
+        return self.symbols.codecs.add(self, kind)
+
+    def emit_loop(self, out, level, src, dst, head, element):
+        d = str(self.ir.depth)
+        item = self.item
+        for a in head:
+            out.line(level, a.format(d=d, src=src, item=item.declaration))
+        if self.is_list:
+            out.line(level, 'for (let i{d} = 0; i{d} < src{d}.length; ++i{d})'.format(d=d))
+            el_src, el_dst = 'src{d}[i{d}]'.format(d=d), 'res{d}[i{d}]'.format(d=d)
+        else:
+            out.line(level, 'for (let key{d} in src{d})'.format(d=d))
+            el_src, el_dst = 'src{d}[key{d}]'.format(d=d), 'res{d}[key{d}]'.format(d=d)
+        if item.is_list or item.is_dict:
+            out.line(level, '{')
+            element(item, out, level + 1, el_src, el_dst)
+            out.line(level, '}')
+        else:
+            element(item, out, level + 1, el_src, el_dst)
+        if dst == None: out.line(level, 'return res{d};'.format(d=d))
+        else: out.line(level, '{dst} = res{d};'.format(dst=dst, d=d))
+
+    def emit_decode(self, out, level, src, dst):
+        if self.is_list:
+            head = ['let src{d} = <Array<any>>{src};', 'let res{d} = new Array<{item}>(src{d}.length);']
+        elif self.is_dict:
+            head = ['let src{d} = <Object>{src};', 'let res{d}: {{[key: string]: {item}}} = {{}};']
+        else:
+            out.line(level, '{0} = {1};'.format(dst, self.from_json(src)))
+            return
+        self.emit_loop(out, level, src, dst, head, Type.emit_decode)
+
+    def emit_encode(self, out, level, src, dst):
+        if self.is_list:
+            head = ['let src{d} = {src};', 'let res{d} = new Array<any>(src{d}.length);']
+        elif self.is_dict:
+            head = ['let src{d} = {src};', 'let res{d}: Object = {{}};']
+        else:
+            out.line(level, '{0} = {1};'.format(dst, self.to_json(src)))
+            return
+        self.emit_loop(out, level, src, dst, head, Type.emit_encode)
+
     @property
     def param_name(self):
-        return 'el' + str(self.index)
+        return 'el' + str(self.ir.depth)
     
     @property
     def declaration(self):
+        prefix = self.symbols.prefix
+        if prefix not in self.declarations:
+            self.declarations[prefix] = self.make_declaration()
+        return self.declarations[prefix]
+
+    def make_declaration(self):
         if self.is_ref: return self.fullref
+        elif self.is_list and self.symbols.immutable: return 'ReadonlyArray<' + self.item_type.declaration + '>'
+        elif self.is_dict and self.symbols.immutable: return '{readonly [key: string]: ' + self.value_type.declaration + '}'
         elif self.is_list: return 'Array<' + self.item_type.declaration + '>'
         elif self.is_dict: return '{[key: string]: ' + self.value_type.declaration + '}'
         elif self.tag == 'json': return 'any'
@@ -175,6 +316,7 @@ class Type:
     def from_json(self, json):
         if self.is_record: return "{s.fullref}.fromJson({json})".format(s=self, json=json)
         elif self.is_enum: return "{s.fullref}FromString({json})".format(s=self, json=json)
+        elif self.symbols.inline and (self.is_list or self.is_dict): return "{0}({1})".format(self.codec('FromJson'), json)
         elif self.is_list:
             el = self.param_name
             return "listFromJson({json}, {el} => {item})".format(json=json, el=el, item=self.item_type.from_json(el))
@@ -189,6 +331,7 @@ class Type:
     def to_json(self, var):
         if self.is_record: return "{var}.toJson()".format(var=var)
         elif self.is_enum: return "{s.fullref}ToString({var})".format(s=self, var=var)
+        elif self.symbols.inline and (self.is_list or self.is_dict): return "{0}({1})".format(self.codec('ToJson'), var)
         elif self.is_list:
             el = self.param_name
             return "listToJson({var}, {el} => {item})".format(var=var, el=el, item=self.item_type.to_json(el))
@@ -199,112 +342,121 @@ class Type:
         elif self.is_simple: return var
         else: raise GenerationError('unknown type ' + self.tag)
 
-def enum_item_desc(data):
-    ref = data['ref']
-    if ref != None:
-        return global_enums[ref].item_desc(data['name'])
-    return data['description']
+    # compact form: records are positional arrays, enums their ordinals
+    def from_compact(self, json):
+        if self.is_record: return "{s.fullref}.fromCompact({json})".format(s=self, json=json)
+        elif self.is_enum: return "<{s.fullref}>{json}".format(s=self, json=json)
+        elif self.is_list:
+            el = self.param_name
+            return "listFromJson({json}, {el} => {item})".format(json=json, el=el, item=self.item_type.from_compact(el))
+        elif self.is_dict:
+            el = self.param_name
+            return "dictFromJson({json}, {el} => {item})".format(json=json, el=el, item=self.value_type.from_compact(el))
+        else: return self.from_json(json)
 
-def enum_item(data):
-    return spaces(1) + inflection.camelize(data['name']) + ', // ' + enum_item_desc(data)
+    def to_compact(self, var):
+        if self.is_record: return "{var}.toCompact()".format(var=var)
+        elif self.is_enum: return var
+        elif self.is_list:
+            el = self.param_name
+            return "listToJson({var}, {el} => {item})".format(var=var, el=el, item=self.item_type.to_compact(el))
+        elif self.is_dict:
+            el = self.param_name
+            return "dictToJson({var}, {el} => {item})".format(var=var, el=el, item=self.value_type.to_compact(el))
+        else: return self.to_json(var)
 
 class Enum:
-    def __init__(self, schema):
-        self.schema = schema
-        global_enums[self.name] = self
+    def __init__(self, ir):
+        self.ir = ir
         
     @property
-    def name(self): return self.schema['name']
-    
-    @property
-    def desc(self): return self.schema['description']
-    
-    @property
-    def items(self): return self.schema['items']
-    
-    @property
-    def items_name(self): return [a['name'] for a in self.items]
+    def name(self): return self.ir.name
     
     @property
-    def items_desc(self): return [enum_item_desc(a) for a in self.items]
-    
-    def item_desc(self, item):
-        for a in self.items:
-            if a['name'] == item:
-                return enum_item_desc(a)
-        raise GenerationError("enum " + self.name + " doesn't have item " + item)
+    def desc(self): return self.ir.description
     
     @property
-    def delcaration(self):
-        return '\n'.join([enum_item(v) for v in self.items])
+    def items(self): return self.ir.items
     
     @property
-    def to_desc(self):
-        return ',\n'.join([spaces(2) + wrap(v.replace("'", "\\'").strip()) for v in self.items_desc])
-    
-    @property
-    def to_json(self):
-        return ',\n'.join([spaces(2) + wrap(v) for v in self.items_name])
+    def items_name(self): return [a.name for a in self.items]
     
     @property
-    def from_json(self):
-        frm = "case '{j}': return {n}.{v};"
-        return '\n'.join([spaces(2) + frm.format(v=inflection.camelize(v),j=v,n=self.name) for v in self.items_name])
+    def items_desc(self): return [a.description for a in self.items]
     
-    def generate(self):
-        return '''
-// {s.desc}
-export const enum {s.name}
-{{
-    Null,
-{s.delcaration}
-    Count
-}}
-export function {s.name}ToString(val: {s.name})
-{{
-    let arr = [
-        null,
-{s.to_json}
-    ];
-    return arr[val]
-}}
-export function {s.name}FromString(json: string)
-{{
-    switch(json)
-    {{
-{s.from_json}
-        default: return {s.name}.Null;
-    }}
-}}
-export function {s.name}ToDescription(val: {s.name})
-{{
-    let arr = [
-        null,
-{s.to_desc}
-    ];
-    return arr[val]
-}}
-export function {s.name}ToSelectOptions(key: string, value: string) : Array<Object>
-{{
-    return selectOptions({s.name}.Count, key, value, {s.name}ToDescription);
-}}
-'''.format(s=self)
+    def emit(self, out):
+        name = self.name
+        out.write('\n')
+        out.line(0, '// ' + self.desc)
+        out.line(0, 'export const enum ' + name)
+        out.line(0, '{')
+        out.line(1, 'Null,')
+        out.block(1, [a.camel + ', // ' + a.description for a in self.items])
+        out.line(1, 'Count')
+        out.line(0, '}')
+        out.line(0, 'const {0}Strings: ReadonlyArray<string> = Object.freeze(['.format(name))
+        out.block(1, ['null'] + [wrap(v) for v in self.items_name], ',')
+        out.line(0, ']);')
+        out.line(0, 'const {0}Descriptions: ReadonlyArray<string> = Object.freeze(['.format(name))
+        out.block(1, ['null'] + [wrap(v.replace("'", "\\'").strip()) for v in self.items_desc], ',')
+        out.line(0, ']);')
+        # the first item of a name wins, like in the index
+        seen = set()
+        values = []
+        for v in self.items:
+            if v.name not in seen:
+                seen.add(v.name)
+                values.append("['{0}', {1}.{2}]".format(v.name, name, v.camel))
+        if values:
+            out.line(0, 'const {0}Values: ReadonlyMap<string, {0}> = new Map<string, {0}>(['.format(name))
+            out.block(1, values, ',')
+            out.line(0, ']);')
+        else:
+            out.line(0, 'const {0}Values: ReadonlyMap<string, {0}> = new Map<string, {0}>();'.format(name))
+        out.line(0, 'export function {0}ToString(val: {0})'.format(name))
+        out.line(0, '{')
+        out.line(1, 'return {0}Strings[val];'.format(name))
+        out.line(0, '}')
+        out.line(0, 'export function {0}FromString(json: string)'.format(name))
+        out.line(0, '{')
+        out.line(1, 'let val = {0}Values.get(json);'.format(name))
+        out.line(1, 'return val === undefined ? {0}.Null : val;'.format(name))
+        out.line(0, '}')
+        out.line(0, 'export function {0}ToDescription(val: {0})'.format(name))
+        out.line(0, '{')
+        out.line(1, 'return {0}Descriptions[val];'.format(name))
+        out.line(0, '}')
+        out.line(0, 'export function {0}ToSelectOptions(key: string, value: string) : Array<Object>'.format(name))
+        out.line(0, '{')
+        out.line(1, 'let res = [];')
+        out.line(1, 'for (let i = 1; i < {0}Descriptions.length; ++i)'.format(name))
+        out.line(1, '{')
+        out.line(2, 'let obj = {};')
+        out.line(2, 'obj[key] = i;')
+        out.line(2, 'obj[value] = {0}Descriptions[i];'.format(name))
+        out.line(2, 'res.push(obj);')
+        out.line(1, '}')
+        out.line(1, 'return res;')
+        out.line(0, '}')
 
 class Property:
-    def __init__(self, schema):
-        self.schema = schema
+    __slots__ = ('ir', 'vartype')
+
+    def __init__(self, ir, symbols):
+        self.ir = ir
+        self.vartype = Type(ir.type, symbols)
 
     @property
-    def name(self): return self.schema['name']
+    def name(self): return self.ir.name
     
     @property
-    def desc(self): return self.schema['description']
+    def desc(self): return self.ir.description
     
     @property
-    def optional(self): return self.schema['optional']
+    def optional(self): return self.ir.optional
     
     @property
-    def is_property(self): return self.schema['property']
+    def is_property(self): return self.ir.property
 
     @property
     def has_varname(self):
@@ -313,13 +465,13 @@ class Property:
     @property
     def private_varname(self):
         return '_' + self.varname
-    
+
     @property
-    def varname(self):
-        return inflection.camelize(self.name, False)
-        
+    def dirty_varname(self):
+        return '_dirty_' + self.varname
+    
     @property
-    def vartype(self): return Type(self.schema['type'])
+    def varname(self): return self.ir.varname
 
     @property
     def vartype_delcaration(self):
@@ -328,17 +480,41 @@ class Property:
         else:
             return self.vartype.declaration
 
+    @property
+    def immutable(self): return self.vartype.symbols.immutable
+
     @property
     def delcaration(self):
         if self.is_property:
             var = "private {s.private_varname}: {s.vartype_delcaration}; // {s.desc}".format(s=self)
             has = "private {s.has_varname}: boolean = false;".format(s=self)
             get = "get {s.varname}() : {s.vartype_delcaration} {{ return this.{s.private_varname}; }}".format(s=self)
-            set = "set {s.varname}(val : {s.vartype_delcaration}) {{ this.{s.private_varname} = val; this.{s.has_varname} = true; }}".format(s=self)
-            return [var, has, get, set]
+            if self.immutable:
+                return [var, has, get]
+            dirty = "private {s.dirty_varname}: boolean = false;".format(s=self)
+            set = "set {s.varname}(val : {s.vartype_delcaration}) {{ this.{s.private_varname} = val; this.{s.has_varname} = true; this.{s.dirty_varname} = true; }}".format(s=self)
+            return [var, has, dirty, get, set]
+        elif self.immutable:
+            return ["readonly {s.varname}: {s.vartype_delcaration}; // {s.desc}".format(s=self)]
         else:
             res = "{s.varname}: {s.vartype_delcaration}; // {s.desc}".format(s=self)
             return [res]
+
+    @property
+    def with_name(self): return 'with' + self.varname[:1].upper() + self.varname[1:]
+
+    # shallow copy, unchanged fields are shared with this record
+    def emit_with(self, out, record):
+        out.line(1, '{s.with_name}(val: {s.vartype_delcaration}): {r}'.format(s=self, r=record))
+        out.line(1, '{')
+        out.line(2, 'let res: any = Object.assign(new {0}(), this);'.format(record))
+        if self.is_property:
+            out.line(2, 'res.{s.private_varname} = val;'.format(s=self))
+            out.line(2, 'res.{s.has_varname} = true;'.format(s=self))
+        else:
+            out.line(2, 'res.{s.varname} = val;'.format(s=self))
+        out.line(2, 'return res;')
+        out.line(1, '}')
         
     @property
     def clone_src(self):
@@ -371,161 +547,263 @@ class Property:
         else:
             return "'{s.name}': {s.type_to_json},".format(s=self)
 
+    # decoded values are set past the setter, so they do not count as changes
     def property_from_json(self):
         prefix = "if ('{s.name}' in json) ".format(s=self) 
+        value = "json['{s.name}'] != null ? {s.type_from_json} : null".format(s=self) if self.optional else self.type_from_json
+        return prefix + "{{ obj.{s.private_varname} = {v}; obj.{s.has_varname} = true; }}".format(s=self, v=value)
+
+    @property
+    def value_to_json(self):
         if self.optional:
-            return prefix + "obj.{s.varname} = json['{s.name}'] != null ? {s.type_from_json} : null;".format(s=self)
+            return "{s.var_src} == null ? null : {s.type_to_json}".format(s=self)
         else:
-            return prefix + "obj.{s.varname} = {s.type_from_json};".format(s=self)      
+            return self.type_to_json
 
     def property_to_json(self):
-        prefix = "if (this.{s.has_varname}) obj['{s.name}'] = "
+        return "if (this.{s.has_varname}) obj['{s.name}'] = {s.value_to_json};".format(s=self)
+
+    def from_compact(self, index, mask, bit):
+        src = 'data[{0}]'.format(index)
+        value = self.vartype.from_compact(src)
+        if self.optional:
+            value = '{0} != null ? {1} : null'.format(src, value)
+        if self.is_property:
+            return "if (data[{m}] & {b}) {{ obj.{s.private_varname} = {v}; obj.{s.has_varname} = true; }}".format(s=self, m=mask, b=bit, v=value)
+        return 'obj.{s.varname} = {v};'.format(s=self, v=value)
+
+    def to_compact(self):
+        value = self.vartype.to_compact(self.var_src)
         if self.optional:
-            return (prefix + "{s.var_src} == null ? null : {s.type_to_json};").format(s=self)
+            value = '{s.var_src} == null ? null : {v}'.format(s=self, v=value)
+        if self.is_property:
+            value = 'this.{s.has_varname} ? {v} : null'.format(s=self, v='(' + value + ')' if self.optional else value)
+        return value
+
+    # a list or dict with a changed record inside is sent whole
+    def emit_patch(self, out):
+        if self.is_property:
+            out.line(2, "if (this.{s.dirty_varname}) obj['{s.name}'] = {s.value_to_json};".format(s=self))
+            if not self.ir.patch:
+                return
+            if not self.vartype.is_record:
+                out.line(2, "else if (itemsChanged({s.var_src})) obj['{s.name}'] = {s.value_to_json};".format(s=self))
+                return
+            out.line(2, 'else if ({s.var_src} != null)'.format(s=self))
+        elif self.ir.patch:
+            if not self.vartype.is_record:
+                out.line(2, "if (itemsChanged({s.var_src})) obj['{s.name}'] = {s.value_to_json};".format(s=self))
+                return
+            out.line(2, 'if ({s.var_src} != null)'.format(s=self))
         else:
-            return (prefix + "{s.type_to_json};").format(s=self)
+            return
+        out.line(2, '{')
+        out.line(3, 'let patch = {s.var_src}.toPatchJson();'.format(s=self))
+        out.line(3, "if (Object.keys(patch).length > 0) obj['{s.name}'] = patch;".format(s=self))
+        out.line(2, '}')
 
-class Record:
-    def __init__(self, schema):
-        self.schema = schema
-        global_records[self.name] = self
+    def mark_clean(self):
+        if self.is_property:
+            yield 'this.{s.dirty_varname} = false;'.format(s=self)
+        if self.ir.patch and not self.vartype.is_record:
+            yield 'markItemsClean({s.var_src});'.format(s=self)
+        elif self.ir.patch:
+            yield 'if ({s.var_src} != null) {s.var_src}.markClean();'.format(s=self)
 
-    @property
-    def name(self): return self.schema['name']
-    
-    @property
-    def desc(self): return self.schema['description']
-    
-    @property
-    def items(self): return [Property(a) for a in self.schema['items']]
-    
-    @property
-    def delcaration(self):
-        return '\n'.join([spaces(1) + d for p in self.items for d in p.delcaration])
+class Record:
+    def __init__(self, ir, symbols):
+        self.ir = ir
+        self.symbols = symbols
+        self.items = [Property(a, symbols) for a in ir.fields]
 
     @property
-    def clone(self):
-        return '\n'.join([spaces(2) + p.clone() for p in self.items]) 
-    
-    @property
-    def from_json(self):
-        return '\n'.join([spaces(2) + p.from_json() for p in self.items if not p.is_property])
-    
-    @property
-    def to_json(self):
-        return '\n'.join([spaces(3) + p.to_json() for p in self.items if not p.is_property])
-    
-    @property
-    def property_from_json(self):
-        return '\n'.join([spaces(2) + p.property_from_json() for p in self.items if p.is_property])
+    def name(self): return self.ir.name
     
     @property
-    def property_to_json(self):
-        return '\n'.join([spaces(2) + p.property_to_json() for p in self.items if p.is_property])
+    def desc(self): return self.ir.description
     
-    def generate(self):
-        return '''
-export class {s.name}
-{{
-{s.delcaration}
-    
-    static fromJson(json: Object): {s.name}
-    {{
-        let obj = new {s.name}();
-{s.from_json}
-{s.property_from_json}
-        return obj;
-    }}
-
-    toJson(): Object
-    {{
-        let obj: Object =
-        {{
-{s.to_json}
-        }};
-{s.property_to_json}
-        return obj;
-    }}
-
-    clone(): {s.name}
-    {{
-        let res = new {s.name}();
-{s.clone}
-        return res;
-    }}
-}}
-'''.format(s=self)
+    def emit(self, out):
+        name = self.name
+        fields = [p for p in self.items if not p.is_property]
+        properties = [p for p in self.items if p.is_property]
+        out.write('\n')
+        out.line(0, 'export class ' + name)
+        out.line(0, '{')
+        out.block(1, [d for p in self.items for d in p.delcaration])
+        out.line(1)
+        out.line(1, 'static fromJson(json: Object): ' + name)
+        out.line(1, '{')
+        if self.symbols.immutable:
+            out.line(2, 'let obj: any = new {0}();'.format(name))
+        else:
+            out.line(2, 'let obj = new {0}();'.format(name))
+        out.block(2, [p.from_json() for p in fields])
+        out.block(2, [p.property_from_json() for p in properties])
+        out.line(2, 'return obj;')
+        out.line(1, '}')
+        out.line(0)
+        out.line(1, 'toJson(): Object')
+        out.line(1, '{')
+        out.line(2, 'let obj: Object =')
+        out.line(2, '{')
+        out.block(3, [p.to_json() for p in fields])
+        out.line(2, '};')
+        out.block(2, [p.property_to_json() for p in properties])
+        out.line(2, 'return obj;')
+        out.line(1, '}')
+        out.line(0)
+        if self.symbols.compact:
+            self.emit_compact(out)
+        out.line(1, 'clone(): ' + name)
+        out.line(1, '{')
+        if self.symbols.immutable:
+            out.line(2, 'return this;')
+            out.line(1, '}')
+            for p in self.items:
+                out.line(0)
+                p.emit_with(out, name)
+            out.line(0, '}')
+            return
+        out.line(2, 'let res = new {0}();'.format(name))
+        out.block(2, [p.clone() for p in self.items])
+        for p in properties:
+            out.line(2, 'res.{s.dirty_varname} = this.{s.dirty_varname};'.format(s=p))
+        out.line(2, 'return res;')
+        out.line(1, '}')
+        if self.ir.patch:
+            self.emit_patch(out)
+        out.line(0, '}')
+
+    # fields by declaration order, then a bit mask of the @property fields present
+    def emit_compact(self, out):
+        name = self.name
+        properties = [p for p in self.items if p.is_property]
+        if len(properties) > 31:
+            raise GenerationError('too many @property fields for the compact codec in ' + name)
+        mask = len(self.items)
+        bits = {p.name: 1 << i for i, p in enumerate(properties)}
+        out.line(1, 'static fromCompact(data: Array<any>): ' + name)
+        out.line(1, '{')
+        if self.symbols.immutable:
+            out.line(2, 'let obj: any = new {0}();'.format(name))
+        else:
+            out.line(2, 'let obj = new {0}();'.format(name))
+        for i, p in enumerate(self.items):
+            out.line(2, p.from_compact(i, mask, bits.get(p.name)))
+        out.line(2, 'return obj;')
+        out.line(1, '}')
+        out.line(0)
+        values = [p.to_compact() for p in self.items]
+        if properties:
+            values.append(' | '.join(['(this.{0} ? {1} : 0)'.format(p.has_varname, bits[p.name]) for p in properties]))
+        out.line(1, 'toCompact(): Array<any>')
+        out.line(1, '{')
+        if values:
+            out.line(2, 'return [')
+            out.block(3, values, ',')
+            out.line(2, '];')
+        else:
+            out.line(2, 'return [];')
+        out.line(1, '}')
+        out.line(0)
+
+    # changes since fromJson (or the last markClean) of the @property fields,
+    # nested records report their own changes, lists and dicts of them are sent
+    # whole when one changed
+    def emit_patch(self, out):
+        name = self.name
+        out.line(0)
+        out.line(1, 'toPatchJson(): Object')
+        out.line(1, '{')
+        out.line(2, 'let obj: Object = {};')
+        for p in self.items:
+            p.emit_patch(out)
+        out.line(2, 'return obj;')
+        out.line(1, '}')
+        out.line(0)
+        out.line(1, 'markClean(): void')
+        out.line(1, '{')
+        for p in self.items:
+            for a in p.mark_clean():
+                out.line(2, a)
+        out.line(1, '}')
 
 def url_text(url):
-    if url['tag'] == 'url': return wrap(url['url'])
-    else: return inflection.camelize(url['param'], False) + ".toString()"
+    tag, value, varname = url
+    if tag == 'url': return wrap(value)
+    else: return varname + ".toString()"
 
-def query_text(schema):
-    type = Type(schema['type'])
-    name = schema['name']
-    var = inflection.camelize(name, False)
-    return wrap(name) + ': ' + type.to_json(var)
+def query_text(param, type):
+    return wrap(param.name) + ': ' + type.to_json(param.varname)
 
 class Service:
-    def __init__(self, schema):
-        self.schema = schema
+    def __init__(self, ir, symbols):
+        self.ir = ir
+        self.body = Type(ir.body, symbols) if ir.body != None else None
+        self.query_types = [(p, Type(p.type, symbols)) for p in ir.query]
+        self.param_types = [(p, Type(p.type, symbols)) for p in ir.params]
+        self.response_types = [(r, Type(r.type, symbols)) for r in ir.responses]
 
     @property
-    def method(self): return self.schema['method'].lower()
+    def method(self): return self.ir.method.lower()
 
     @property
-    def name(self): return inflection.camelize(self.schema['name'], False)
+    def name(self): return self.ir.varname
     
     @property
-    def has_body(self): return self.schema['body'] != None
+    def has_body(self): return self.body != None
     
     @property
-    def desc(self):
-        return '\n'.join([spaces(1) + '// ' + a for a in self.schema['description'].split('\n')])
+    def desc(self): return self.ir.description
     
     @property
     def url(self):
-        return ' + '.join([url_text(a) for a in self.schema['url']])
+        return ' + '.join([url_text(a) for a in self.ir.url])
 
     @property
     def query(self):
-        return '{' + ', '.join([query_text(p) for p in self.schema['query']]) + '}';
+        return '{' + ', '.join([query_text(p, t) for p, t in self.query_types]) + '}';
     
     @property
     def fun_name(self):
         base = self.name[1:].replace('/', '_').replace('-', '_').replace(':', '')
-        return self.method + inflection.camelize(base)
+        return self.method + camelize(base)
     
     @property
     def fun_args(self):
         args = []
-        for p in (self.schema['params'] + self.schema['query']):
-            vartype = Type(p['type'])
-            args.append(inflection.camelize(p['name'], False) + ': ' + vartype.declaration)
+        for p, vartype in (self.param_types + self.query_types):
+            args.append(p.varname + ': ' + vartype.declaration)
         if self.has_body:
-            vartype = Type(self.schema['body'])
-            args.append('body: ' + vartype.declaration)
+            args.append('body: ' + self.body.declaration)
         return ', '.join(args)
     
+    @property
+    def cached(self): return self.ir.cache != None
+
+    @property
+    def cache_name(self): return self.name + 'Cache'
+
     @property
     def call_args(self):
+        if self.cached:
+            return 'path, query'
         args = [self.url, self.query]
         if self.method != 'get':
             if self.has_body:
-                vartype = Type(self.schema['body'])
-                args.append(vartype.to_json('body'))
+                args.append(self.body.to_json('body'))
             else:
                 args.append('{}')
         return ', '.join(args)
 
     def find_response_200(self):
-        for v in self.schema['responses']:
-            if v['status'] == 200:
-                return v
+        for v, vartype in self.response_types:
+            if v.status == 200:
+                return vartype
         raise GenerationError('empty_200_reply')
 
     def response_type(self):
-        return Type(self.find_response_200()['type'])
+        return self.find_response_200()
 
     @property
     def response_declaration(self):
@@ -536,133 +814,178 @@ class Service:
         vartype = self.response_type()
         return vartype.from_json('response.json()')
     
-    def response_error(self, schema):
-        s = schema['status']
-        r = Type(schema['type']).from_json('response.json()')
+    def response_error(self, response, vartype):
+        s = response.status
+        r = vartype.from_json('response.json()')
         return 'case {s}: return Observable.throw({r});'.format(s=s,r=r)
     
-    @property
-    def response_errors(self):
-        return '\n'.join([spaces(5) + self.response_error(v) for v in self.schema['responses'] if v['status'] != 200])
-
-    def generate(self):
-        return '''
-{s.desc}
-    {s.name}({s.fun_args}): Observable<{s.response_declaration}>
-    {{
-        return this.{s.method}({s.call_args})
-            .catch(response =>
-            {{
-                switch(response.status)
-                {{
-{s.response_errors}
-                    default: return Observable.throw(response);
-                }}
-            }})
-            .map(response => {s.response_ok});
-    }}
-'''.format(s=self)
+    def emit_cache(self, out):
+        if self.method != 'get':
+            raise GenerationError('cache is only supported for GET services, not ' + self.ir.name)
+        size = self.ir.cache['size'] if self.ir.cache['size'] != None else default_cache_size
+        out.write('\n')
+        out.line(1, 'private {0} = new ServiceCache<Response>({1}, {2});'.format(self.cache_name, self.ir.cache['ttl'] * 1000, size))
+
+    def emit(self, out):
+        if self.cached:
+            self.emit_cache(out)
+        out.write('\n')
+        out.block(1, ['// ' + a for a in self.desc.split('\n')])
+        out.line(1, '{s.name}({s.fun_args}): Observable<{s.response_declaration}>'.format(s=self))
+        out.line(1, '{')
+        if self.cached:
+            out.line(2, 'let path = {0};'.format(self.url))
+            out.line(2, 'let query = {0};'.format(self.query))
+            out.line(2, "return this.{s.cache_name}.get(path + '?' + JSON.stringify(query), () => this.{s.method}({s.call_args})".format(s=self))
+        else:
+            out.line(2, 'return this.{s.method}({s.call_args})'.format(s=self))
+        out.line(3, '.catch(response =>')
+        out.line(3, '{')
+        out.line(4, 'switch(response.status)')
+        out.line(4, '{')
+        out.block(5, [self.response_error(v, t) for v, t in self.response_types if v.status != 200])
+        out.line(5, 'default: return Observable.throw(response);')
+        out.line(4, '}')
+        # cached responses are decoded per subscriber, so callers never share records
+        out.line(3, '}}){0}'.format(')' if self.cached else ''))
+        out.line(3, '.map(response => {0});'.format(self.response_ok))
+        out.line(1, '}')
 
 class Notification:
-    def __init__(self, schema):
-        self.schema = schema
+    def __init__(self, ir, symbols):
+        self.ir = ir
+        self.payload = Type(ir.payload, symbols) if ir.payload != None else None
     
     @property
-    def name(self): return inflection.camelize(self.schema['name']) + 'Notification'
+    def name(self): return self.ir.classname
     @property
-    def varname(self): return inflection.camelize(self.schema['name'], False)
+    def varname(self): return self.ir.varname
     @property
-    def kind(self): return self.schema['kind'] if self.schema['kind'] != None else inflection.underscore(self.schema['name'])
+    def kind(self): return self.ir.kind
     @property
-    def has_payload(self): return self.schema['payload'] != None
-    def payload_type(self): return Type(self.schema['payload'])
+    def has_payload(self): return self.payload != None
+    def payload_type(self): return self.payload
     def payload_declaration(self): return self.payload_type().declaration if self.has_payload else 'any';
     def payload_from_json(self): return self.payload_type().from_json("json['payload']") if self.has_payload else 'null';
 
-    def generate(self):
-        return '''
-export class {s.name} extends ProtocolNotification
-{{
-    payload: {payload_declaration};
-    
-    constructor(json: Object)
-    {{
-        super(json['kind']);
-        this.payload = {payload_from_json};
-    }}
-}}
-'''.format(s=self, payload_declaration=self.payload_declaration(), payload_from_json=self.payload_from_json())
+    def emit(self, out):
+        out.write('\n')
+        out.line(0, 'export class {0} extends ProtocolNotification'.format(self.name))
+        out.line(0, '{')
+        if not self.has_payload:
+            out.line(1, 'payload: any = null;')
+            out.line(1)
+            out.line(1, 'constructor(json: Object)')
+            out.line(1, '{')
+            out.line(2, "super(json['kind']);")
+            out.line(1, '}')
+            out.line(0, '}')
+            return
+        declaration = self.payload_declaration()
+        out.line(1, 'private _json: Object;')
+        out.line(1, 'private _payload: {0};'.format(declaration))
+        out.line(1)
+        out.line(1, 'constructor(json: Object)')
+        out.line(1, '{')
+        out.line(2, "super(json['kind']);")
+        out.line(2, 'this._json = json;')
+        out.line(1, '}')
+        out.line(0)
+        out.line(1, '// decoded on first access')
+        out.line(1, 'get payload(): {0}'.format(declaration))
+        out.line(1, '{')
+        out.line(2, 'if (this._json !== null)')
+        out.line(2, '{')
+        out.line(3, 'let json = this._json;')
+        out.line(3, 'this._json = null;')
+        out.line(3, 'this._payload = {0};'.format(self.payload_from_json()))
+        out.line(2, '}')
+        out.line(2, 'return this._payload;')
+        out.line(1, '}')
+        out.line(0)
+        out.line(1, 'set payload(value: {0})'.format(declaration))
+        out.line(1, '{')
+        out.line(2, 'this._json = null;')
+        out.line(2, 'this._payload = value;')
+        out.line(1, '}')
+        out.line(0, '}')
 
     def generate_declare(self):
         return '{s.varname} = new Subject<{s.name}>();'.format(s=self)
 
-    def generate_match(self):
-        return "case '{s.kind}': this.{s.varname}.next(new {s.name}(message)); break;".format(s=self)
-
-class FileNotification:
-    def __init__(self, data):
-        self.data = data
+    def generate_handler(self):
+        return "['{s.kind}', message => this.dispatch(this.{s.varname}, {s.name}, message)]".format(s=self)
 
-    @property
-    def classes(self):
-        return ''.join([a.generate() for a in self.data])
-    
-    @property
-    def declare(self):
-        return '\n'.join([spaces(1) + a.generate_declare() for a in self.data])
-    
-    @property
-    def match(self):
-        return '\n'.join([spaces(3) + a.generate_match() for a in self.data])
-    
-    def generate(self):
-        global global_prefix
-        global_prefix = 'Protocol.'
-        return '''
-import {{Subject}} from "rxjs/Rx";
+notification_head = '''
+import {Subject} from "rxjs/Rx";
 import * as Protocol from "./protocol.data"
 
 export class ProtocolNotification
-{{
-    constructor(public kind: string) {{ }}
-}}
-{s.classes}
-
-export abstract class ProtocolNotificationService
-{{
-{s.declare}
-
-    constructor() {{ }}
-
-    push(message: Object)
-    {{
-        switch (message['kind'])
-        {{
-{s.match}
-            default: this.unknown(message); break;
-        }}
-    }}
-
-    unknown(message: Object)
-    {{
-        console.log('Unknown notification', JSON.stringify(message));
-    }}
-}}
-'''.format(s=self)
+{
+    constructor(public kind: string) { }
+}
+'''
+
+# kinds nobody subscribed to are dropped before their notification is built
+def emit_notification_tail(out, notifications):
+    out.write('\n\n')
+    out.line(0, 'export abstract class ProtocolNotificationService')
+    out.line(0, '{')
+    out.block(1, [a.generate_declare() for a in notifications])
+    out.line(0)
+    out.line(1, 'private handlers = new Map<string, (message: Object) => void>([')
+    out.block(2, [a.generate_handler() for a in notifications], ',')
+    out.line(1, ']);')
+    out.line(0)
+    out.line(1, 'constructor() { }')
+    out.line(0)
+    out.line(1, 'push(message: Object)')
+    out.line(1, '{')
+    out.line(2, "let handler = this.handlers.get(message['kind']);")
+    out.line(2, 'if (handler !== undefined)')
+    out.line(3, 'handler(message);')
+    out.line(2, 'else')
+    out.line(3, 'this.unknown(message);')
+    out.line(1, '}')
+    out.line(0)
+    out.line(1, 'pushBatch(messages: Object[])')
+    out.line(1, '{')
+    out.line(2, 'for (let message of messages)')
+    out.line(3, 'this.push(message);')
+    out.line(1, '}')
+    out.line(0)
+    out.line(1, 'unknown(message: Object)')
+    out.line(1, '{')
+    out.line(2, "console.log('Unknown notification', JSON.stringify(message));")
+    out.line(1, '}')
+    out.line(0)
+    out.line(1, 'private dispatch<T>(subject: Subject<T>, notification: new (json: Object) => T, message: Object)')
+    out.line(1, '{')
+    out.line(2, 'if (subject.observers.length > 0)')
+    out.line(3, 'subject.next(new notification(message));')
+    out.line(1, '}')
+    out.line(0, '}')
+
+class FileNotification:
+    def __init__(self, data, symbols):
+        self.data = data
+        self.symbols = symbols
+
+    def emit(self, out):
+        self.symbols.prefix = 'Protocol.'
+        out.write(notification_head)
+        self.symbols.codecs = Codecs()
+        for a in self.data:
+            a.emit(out)
+        emit_notification_tail(out, self.data)
+        emit_codecs(out, self.symbols)
 
-class FileService:
-    def __init__(self, services):
-        self.services = services
-        
-    def requests(self):
-        return ''.join([a.generate() for a in self.services])
-    
     def generate(self):
-        global global_prefix
-        global_prefix = 'Protocol.'
-        return '''
-import {Observable} from "rxjs/Rx";
-import {Response} from "@angular/http";
+        return render(self.emit)
+
+service_head = '''
+import {Observable, Observer} from "rxjs/Rx";
+import {Response, ResponseOptions} from "@angular/http";
 import * as Protocol from "./protocol.data"
 
 export abstract class ProtocolService
@@ -673,32 +996,356 @@ export abstract class ProtocolService
     abstract put(path: string, query: Object, body: Object): Observable<Response>;
     abstract delete(path: string, query: Object, body: Object): Observable<Response>;
     abstract post(path: string, query: Object, body: Object): Observable<Response>;
-%requests%
+'''
+
+service_tail = '''
 }
-'''.replace('%requests%', self.requests())
+'''
 
-def print_declarations(name, data):
-    print(name + ': \n  ' + '\n  '.join([a.name for a in data]))
+default_cache_size = 100
+
+# emitted once any service is declared with `cache <ttl seconds>[, <size>];`
+service_cache = '''
+// responses are shared by calls with the same url and query while the request
+// is in flight and for ttl milliseconds after the response arrives; failed
+// requests are dropped, and the oldest entry goes once size entries are held
+export class ServiceCache<T>
+{
+    private entries = new Map<string, {expires: number, value: Observable<T>}>();
+
+    constructor(private ttl: number, private size: number) { }
+
+    get(key: string, request: () => Observable<T>): Observable<T>
+    {
+        let now = Date.now();
+        let entry = this.entries.get(key);
+        if (entry !== undefined && entry.expires > now)
+            return entry.value;
+        this.entries.delete(key);
+        if (this.entries.size >= this.size)
+            this.entries.delete(this.entries.keys().next().value);
+        let added: {expires: number, value: Observable<T>} = {expires: Infinity, value: null};
+        added.value = request()
+            .do(() => { added.expires = Date.now() + this.ttl; },
+                () => { if (this.entries.get(key) === added) this.entries.delete(key); })
+            .publishReplay(1)
+            .refCount();
+        this.entries.set(key, added);
+        return added.value;
+    }
+
+    clear()
+    {
+        this.entries.clear();
+    }
+}
+'''
+
+# a ProtocolService sending the calls queued within a tick as one POST of
+# [{method, path, query, body}] answered by [{status, body}] in the same order;
+# replies go back as responses, so the generated status mapping applies as is
+class Batch:
+    def __init__(self, ir):
+        self.ir = ir
+
+    @property
+    def name(self): return self.ir.classname
+
+    @property
+    def url(self):
+        if not self.ir.url or any(a[0] != 'url' for a in self.ir.url):
+            raise GenerationError('batch needs a url without params: ' + self.ir.name)
+        return ' + '.join([url_text(a) for a in self.ir.url])
+
+    def emit(self, out):
+        out.write('\n')
+        out.block(0, ['// ' + a for a in self.ir.description.split('\n')])
+        out.line(0, 'export class {0} extends ProtocolService'.format(self.name))
+        out.line(0, '{')
+        out.line(1, 'private queue: {method: string, path: string, query: Object, body: Object, observer: Observer<Response>}[] = [];')
+        out.line(0)
+        out.line(1, 'constructor(private transport: ProtocolService) { super(); }')
+        out.line(0)
+        out.line(1, "get(path: string, query: Object): Observable<Response> { return this.call('GET', path, query, null); }")
+        out.line(1, "put(path: string, query: Object, body: Object): Observable<Response> { return this.call('PUT', path, query, body); }")
+        out.line(1, "delete(path: string, query: Object, body: Object): Observable<Response> { return this.call('DELETE', path, query, body); }")
+        out.line(1, "post(path: string, query: Object, body: Object): Observable<Response> { return this.call('POST', path, query, body); }")
+        out.line(0)
+        out.line(1, 'private call(method: string, path: string, query: Object, body: Object): Observable<Response>')
+        out.line(1, '{')
+        out.line(2, 'return Observable.create((observer: Observer<Response>) =>')
+        out.line(2, '{')
+        out.line(3, 'if (this.queue.length == 0)')
+        out.line(4, 'setTimeout(() => this.flush(), 0);')
+        out.line(3, 'let call = {method: method, path: path, query: query, body: body, observer: observer};')
+        out.line(3, 'this.queue.push(call);')
+        out.line(3, '// unsubscribing before the flush takes the call out of the batch')
+        out.line(3, 'return () =>')
+        out.line(3, '{')
+        out.line(4, 'let i = this.queue.indexOf(call);')
+        out.line(4, 'if (i >= 0)')
+        out.line(5, 'this.queue.splice(i, 1);')
+        out.line(3, '};')
+        out.line(2, '});')
+        out.line(1, '}')
+        out.line(0)
+        out.line(1, 'flush()')
+        out.line(1, '{')
+        out.line(2, 'let calls = this.queue;')
+        out.line(2, 'this.queue = [];')
+        out.line(2, 'if (calls.length == 0)')
+        out.line(3, 'return;')
+        out.line(2, 'let body = calls.map(a => ({method: a.method, path: a.path, query: a.query, body: a.body}));')
+        out.line(2, 'this.transport.post({0}, {{}}, body).subscribe(response =>'.format(self.url))
+        out.line(2, '{')
+        out.line(3, 'let results = <Object[]>response.json();')
+        out.line(3, 'calls.forEach((a, i) =>')
+        out.line(3, '{')
+        out.line(4, 'let result = results[i];')
+        out.line(4, 'if (result === undefined)')
+        out.line(5, 'return a.observer.error(response);')
+        out.line(4, "let reply = new Response(new ResponseOptions({status: result['status'], body: result['body'], url: a.path}));")
+        out.line(4, 'if (reply.ok)')
+        out.line(4, '{')
+        out.line(5, 'a.observer.next(reply);')
+        out.line(5, 'a.observer.complete();')
+        out.line(4, '}')
+        out.line(4, 'else')
+        out.line(5, 'a.observer.error(reply);')
+        out.line(3, '});')
+        out.line(2, '}, error => calls.forEach(a => a.observer.error(error)));')
+        out.line(1, '}')
+        out.line(0, '}')
+
+class FileService:
+    def __init__(self, services, symbols, batches=[]):
+        self.services = services
+        self.symbols = symbols
+        self.batches = batches
+
+    def emit(self, out):
+        self.symbols.prefix = 'Protocol.'
+        out.write(service_head)
+        self.symbols.codecs = Codecs()
+        for a in self.services:
+            a.emit(out)
+        out.write(service_tail)
+        for a in self.batches:
+            a.emit(out)
+        if any(a.cached for a in self.services):
+            out.write(service_cache)
+        emit_codecs(out, self.symbols)
+
+    def generate(self):
+        return render(self.emit)
+
+helpers = re.findall(r'^function (\w+)', header, re.M)
+helpers_module = '_helpers'
+modules_folder = 'protocol'
+helpers_path = modules_folder + '/' + helpers_module + '.ts'
+
+def module_name(path):
+    return re.sub(r'\W', '_', os.path.splitext(os.path.basename(path))[0])
+
+class DataModule:
+    def __init__(self, name, definitions, symbols):
+        self.name = name
+        self.definitions = definitions
+        self.symbols = symbols
+
+    @property
+    def path(self): return modules_folder + '/' + self.name + '.ts'
+
+    def imports(self, owners, body):
+        imports = {}
+        for a in self.definitions:
+            if isinstance(a, Record):
+                for t in a.ir.refs:
+                    names = [t.ref, t.ref + 'FromString', t.ref + 'ToString'] if t.is_enum else [t.ref]
+                    if owners[t.ref] != self.name:
+                        imports.setdefault(owners[t.ref], {}).update(dict.fromkeys(names))
+        used = set(re.findall(r'\b(\w+)\(', body))
+        names = [a for a in helpers if a in used]
+        if names:
+            imports[helpers_module] = dict.fromkeys(names)
+        return [(a, sorted(imports[a])) for a in sorted(imports)]
+
+    def emit(self, out, owners):
+        body = render(self.emit_body)
+        for module, names in self.imports(owners, body):
+            out.line(0, 'import {{{0}}} from "./{1}";'.format(', '.join(names), module))
+        out.write(body)
+
+    def emit_body(self, out):
+        self.symbols.codecs = Codecs()
+        for a in self.definitions:
+            a.emit(out)
+        emit_codecs(out, self.symbols)
+
+def print_declarations(name, names):
+    print(name + ': \n  ' + '\n  '.join(names))
 
 class IgorGeneratorTs:
-    def __init__(self, schema):
+    def __init__(self, schema, verbose=True, codec='helpers', records='mutable', compact=False):
         self.schema = schema
-        self.services = [Service(a) for a in schema if a['tag'] == 'service']
-        self.notifications = [Notification(a) for a in schema if a['tag'] == 'notification']
-        self.records = [Record(a) for a in schema if a['tag'] == 'record']
-        self.enums = [Enum(a) for a in schema if a['tag'] == 'enum']
-        print_declarations('Enums', self.enums)
-        print_declarations('Records', self.records)
-        print_declarations('Services', self.services)
-        print_declarations('Notifications', self.notifications)
+        self.symbols = Symbols(codec, records, compact)
+        self.ir = IrSchema(schema)
+        self.services = [Service(a, self.symbols) for a in self.ir.services]
+        self.notifications = [Notification(a, self.symbols) for a in self.ir.notifications]
+        self.batches = [Batch(a) for a in self.ir.batches]
+        self.records = [Record(a, self.symbols) for a in self.ir.records]
+        self.enums = [Enum(a) for a in self.ir.enums]
+        if verbose:
+            print_declarations('Enums', [a.name for a in self.enums])
+            print_declarations('Records', [a.name for a in self.records])
+            print_declarations('Services', [a.name for a in self.services])
+            print_declarations('Notifications', [a.name for a in self.notifications])
+            print_declarations('Batches', [a.name for a in self.batches])
     
+    def emit_data(self, out):
+        self.ir.resolve()
+        self.symbols.prefix = ''
+        out.write(header_text(self.symbols))
+        self.symbols.codecs = Codecs()
+        for a in self.enums:
+            a.emit(out)
+        for a in self.records:
+            a.emit(out)
+        emit_codecs(out, self.symbols)
+
+    def emit_service(self, out):
+        FileService(self.services, self.symbols, self.batches).emit(out)
+
+    def emit_notification(self, out):
+        FileNotification(self.notifications, self.symbols).emit(out)
+
+    # layout 'definition' gives every enum and record its own module, layout
+    # 'file' groups them by the (name, definitions) source pairs
+    def data_modules(self, layout, sources=None):
+        self.ir.resolve()
+        self.symbols.prefix = ''
+        if layout == 'file':
+            files = {helpers_module: None}
+            for f, data in sources:
+                name = module_name(f)
+                if files.setdefault(name, f) != f:
+                    raise GenerationError('{0} and {1} both give module {2}'.format(files[name] or helpers_path, f, name))
+            owner = {a['name']: module_name(f) for f, data in sources for a in data if a['tag'] in ('enum', 'record')}
+        else:
+            owner = {a.name: a.name for a in self.enums + self.records}
+        modules = {}
+        for a in self.enums + self.records:
+            modules.setdefault(owner[a.name], []).append(a)
+        return [DataModule(k, modules[k], self.symbols) for k in sorted(modules)]
+
+    def emit_helpers(self, out):
+        out.write(header_text(self.symbols).replace('\nfunction ', '\nexport function '))
+
+    def module_owners(self, modules):
+        return {a.name: m.name for m in modules for a in m.definitions}
+
+    def emit_module(self, out, module, owners):
+        self.symbols.prefix = ''
+        module.emit(out, owners)
+
+    def emit_index(self, out, modules):
+        out.write('\n')
+        for a in modules:
+            out.line(0, 'export * from "./{0}/{1}";'.format(modules_folder, a.name))
+
+    def generate_modules(self, layout, sources=None):
+        modules = self.data_modules(layout, sources)
+        owners = self.module_owners(modules)
+        files = {helpers_path: render(self.emit_helpers)}
+        for a in modules:
+            files[a.path] = render(self.emit_module, a, owners)
+        files['protocol.data.ts'] = render(self.emit_index, modules)
+        return files
+
     def generate_data(self):
-        global global_prefix
-        global_prefix = ''
-        return header + ''.join([a.generate() for a in self.enums]) + ''.join([a.generate() for a in self.records])
+        return render(self.emit_data)
 
     def generate_service(self):
-        return FileService(self.services).generate();
+        return render(self.emit_service)
     
     def generate_notification(self):
-        return FileNotification(self.notifications).generate();
+        return render(self.emit_notification)
+
+class IgorStreamGeneratorTs:
+    def __init__(self, codec='helpers', records='mutable', compact=False):
+        self.symbols = Symbols(codec, records, compact)
+        self.builder = IrBuilder()
+        self.enums = []
+        self.names = {'record': [], 'service': [], 'notification': [], 'batch': []}
+
+    def collect(self, definitions):
+        for a in definitions:
+            if a['tag'] == 'enum':
+                self.enums.append(Enum(self.builder.declare(a)))
+            elif a['tag'] == 'record':
+                self.names['record'].append(self.builder.declare(a).name)
+            elif a['tag'] == 'service':
+                self.names['service'].append(self.builder.service(a).varname)
+            elif a['tag'] == 'notification':
+                self.names['notification'].append(self.builder.notification(a).classname)
+            elif a['tag'] == 'batch':
+                self.names['batch'].append(self.builder.batch(a).classname)
+            yield a
+
+    def print_declarations(self):
+        print_declarations('Enums', [a.name for a in self.enums])
+        print_declarations('Records', self.names['record'])
+        print_declarations('Services', self.names['service'])
+        print_declarations('Notifications', self.names['notification'])
+        print_declarations('Batches', self.names['batch'])
+
+    def generate(self, definitions, data, service, notification):
+        with Emitter(data) as data, Emitter(service) as service, Emitter(notification) as notification:
+            self.emit(definitions, data, service, notification)
+
+    def emit(self, definitions, data, service, notification):
+        self.symbols.prefix = ''
+        data.write(header_text(self.symbols))
+        for a in self.enums:
+            self.builder.resolve(a.ir)
+            a.emit(data)
+        service.write(service_head)
+        notification.write(notification_head)
+        notifications = []
+        batches = []
+        cached = False
+        codecs = {'data': Codecs(), 'service': Codecs(), 'notification': Codecs()}
+        for a in definitions:
+            if a['tag'] == 'record':
+                self.symbols.prefix = ''
+                self.symbols.codecs = codecs['data']
+                Record(self.builder.record(a), self.symbols).emit(data)
+            elif a['tag'] == 'service':
+                self.symbols.prefix = 'Protocol.'
+                self.symbols.codecs = codecs['service']
+                s = Service(self.builder.service(a), self.symbols)
+                s.emit(service)
+                cached = cached or s.cached
+            elif a['tag'] == 'notification':
+                self.symbols.prefix = 'Protocol.'
+                self.symbols.codecs = codecs['notification']
+                n = Notification(self.builder.notification(a), self.symbols)
+                n.emit(notification)
+                notifications.append(n)
+            elif a['tag'] == 'batch':
+                # batches extend ProtocolService, so they follow its closing brace
+                batches.append(Batch(self.builder.batch(a)))
+        self.symbols.prefix = ''
+        self.symbols.codecs = codecs['data']
+        emit_codecs(data, self.symbols)
+        self.symbols.prefix = 'Protocol.'
+        self.symbols.codecs = codecs['service']
+        service.write(service_tail)
+        for a in batches:
+            a.emit(service)
+        if cached:
+            service.write(service_cache)
+        emit_codecs(service, self.symbols)
+        self.symbols.codecs = codecs['notification']
+        emit_notification_tail(notification, notifications)
+        emit_codecs(notification, self.symbols)
@@ -0,0 +1,258 @@
+from .utils import *
+
+# resolved intermediate representation built once from the parser schema
+# type references are linked to their definitions, enum item descriptions
+# are resolved and names are camelized, so generators do a single walk
+
+simple_types = ('number', 'int', 'string', 'bool', 'json', 'Date')
+
+class IrType:
+    __slots__ = ('tag', 'ref', 'kind', 'target', 'item', 'depth')
+
+    def __init__(self, tag, ref=None, kind=None, target=None, item=None, depth=1):
+        self.tag = tag
+        self.ref = ref
+        self.kind = kind
+        self.target = target
+        self.item = item
+        self.depth = depth
+
+    @property
+    def is_ref(self): return self.tag == 'ref'
+
+    @property
+    def is_list(self): return self.tag == 'list'
+
+    @property
+    def is_dict(self): return self.tag == 'dict'
+
+    @property
+    def is_enum(self): return self.kind == 'enum'
+
+    @property
+    def is_record(self): return self.kind == 'record'
+
+    @property
+    def is_simple(self): return self.tag in simple_types
+
+    @property
+    def leaf(self):
+        type = self
+        while type.item != None:
+            type = type.item
+        return type
+
+class IrEnumItem:
+    __slots__ = ('name', 'camel', 'ref', 'description')
+
+    def __init__(self, schema):
+        self.name = schema['name']
+        self.camel = camelize(self.name)
+        self.ref = schema['ref']
+        self.description = schema['description'] if self.ref == None else None
+
+class IrEnum:
+    __slots__ = ('name', 'description', 'items', 'index')
+
+    def __init__(self, schema):
+        self.name = schema['name']
+        self.description = schema['description']
+        self.items = [IrEnumItem(a) for a in schema['items']]
+        self.index = {}
+        for a in self.items:
+            self.index.setdefault(a.name, a)
+
+def schema_leaf(type):
+    while type['tag'] in ('list', 'dict'):
+        type = type['item_type'] if type['tag'] == 'list' else type['value_type']
+    return type
+
+class IrField:
+    __slots__ = ('name', 'varname', 'description', 'type', 'optional', 'property', 'patch')
+
+    def __init__(self, schema, type):
+        self.name = schema['name']
+        self.varname = camelize(self.name, False)
+        self.description = schema['description']
+        self.type = type
+        self.optional = schema['optional']
+        self.property = schema['property']
+        self.patch = False
+
+class IrRecord:
+    __slots__ = ('name', 'description', 'fields', 'properties', 'links', 'patch')
+
+    def __init__(self, schema, fields):
+        self.name = schema['name']
+        self.description = schema['description']
+        self.fields = fields
+        self.properties = any(a['property'] for a in schema['items'])
+        self.links = [leaf['ref'] for leaf in (schema_leaf(a['type']) for a in schema['items']) if leaf['tag'] == 'ref']
+        self.patch = False
+
+    @property
+    def refs(self):
+        return [a.type.leaf for a in self.fields if a.type.leaf.kind != None]
+
+class IrParam:
+    __slots__ = ('name', 'varname', 'description', 'type')
+
+    def __init__(self, schema, type):
+        self.name = schema['name']
+        self.varname = camelize(self.name, False)
+        self.description = schema['description']
+        self.type = type
+
+class IrResponse:
+    __slots__ = ('status', 'description', 'type')
+
+    def __init__(self, schema, type):
+        self.status = schema['status']
+        self.description = schema['description']
+        self.type = type
+
+class IrService:
+    __slots__ = ('name', 'varname', 'description', 'method', 'url', 'cache', 'body', 'query', 'params', 'responses')
+
+    def __init__(self, schema, body, query, params, responses):
+        self.name = schema['name']
+        self.varname = camelize(self.name, False)
+        self.description = schema['description']
+        self.method = schema['method']
+        self.url = [(a['tag'], a[a['tag']], camelize(a['param'], False) if a['tag'] == 'param' else None) for a in schema['url']]
+        self.cache = schema.get('cache')
+        self.body = body
+        self.query = query
+        self.params = params
+        self.responses = responses
+
+class IrNotification:
+    __slots__ = ('name', 'classname', 'varname', 'description', 'kind', 'payload')
+
+    def __init__(self, schema, payload):
+        self.name = schema['name']
+        self.classname = camelize(self.name) + 'Notification'
+        self.varname = camelize(self.name, False)
+        self.description = schema['description']
+        self.kind = schema['kind'] if schema['kind'] != None else underscore(self.name)
+        self.payload = payload
+
+class IrBatch:
+    __slots__ = ('name', 'classname', 'description', 'url')
+
+    def __init__(self, schema):
+        self.name = schema['name']
+        self.classname = camelize(self.name) + 'Batch'
+        self.description = schema['description']
+        self.url = [(a['tag'], a[a['tag']], camelize(a['param'], False) if a['tag'] == 'param' else None) for a in schema['url'] or []]
+
+class IrBuilder:
+    def __init__(self):
+        self.enums = {}
+        self.records = {}
+        self.item_descs = {}
+        self.patches = {}
+
+    def declare(self, schema):
+        if schema['tag'] == 'enum':
+            enum = IrEnum(schema)
+            self.enums[enum.name] = enum
+            return enum
+        if schema['tag'] == 'record':
+            record = IrRecord(schema, [])
+            self.records.setdefault(record.name, record)
+            return record
+
+    def type(self, schema, depth=1):
+        tag = schema['tag']
+        if tag == 'ref':
+            ref = schema['ref']
+            if ref in self.records:
+                return IrType(tag, ref, 'record', self.records[ref], depth=depth)
+            if ref in self.enums:
+                return IrType(tag, ref, 'enum', self.enums[ref], depth=depth)
+            return IrType(tag, ref, depth=depth)
+        if tag == 'list':
+            return IrType(tag, item=self.type(schema['item_type'], depth + 1), depth=depth)
+        if tag == 'dict':
+            return IrType(tag, item=self.type(schema['value_type'], depth + 1), depth=depth)
+        return IrType(tag, depth=depth)
+
+    def enum_item_desc(self, ref, name):
+        key = (ref, name)
+        if key not in self.item_descs:
+            if ref not in self.enums:
+                raise GenerationError("unknown enum " + ref)
+            enum = self.enums[ref]
+            if name not in enum.index:
+                raise GenerationError("enum " + ref + " doesn't have item " + name)
+            self.item_descs[key] = None
+            item = enum.index[name]
+            self.item_descs[key] = item.description if item.ref == None else self.enum_item_desc(item.ref, name)
+        elif self.item_descs[key] == None:
+            raise GenerationError("cyclic enum item reference " + ref + "." + name)
+        return self.item_descs[key]
+
+    def resolve(self, enum):
+        for a in enum.items:
+            if a.ref != None:
+                a.description = self.enum_item_desc(a.ref, a.name)
+        return enum
+
+    # records with @property fields, or a record field (or list and dict of
+    # records) leading to one, track changes; works on declared records so
+    # forward references are fine
+    def patchable(self, name):
+        if name not in self.patches:
+            seen = set()
+            stack = [name]
+            found = False
+            while stack and not found:
+                a = stack.pop()
+                if a in seen or a not in self.records:
+                    continue
+                seen.add(a)
+                found = self.records[a].properties
+                stack += self.records[a].links
+            self.patches[name] = found
+        return self.patches[name]
+
+    def record(self, schema, record=None):
+        record = record or IrRecord(schema, [])
+        record.fields = [IrField(a, self.type(a['type'])) for a in schema['items']]
+        record.patch = self.patchable(record.name)
+        for a in record.fields:
+            a.patch = a.type.leaf.is_record and self.patchable(a.type.leaf.ref)
+        return record
+
+    def service(self, schema):
+        return IrService(schema,
+            self.type(schema['body']) if schema['body'] != None else None,
+            [IrParam(a, self.type(a['type'])) for a in schema['query']],
+            [IrParam(a, self.type(a['type'])) for a in schema['params']],
+            [IrResponse(a, self.type(a['type'])) for a in schema['responses']])
+
+    def notification(self, schema):
+        return IrNotification(schema, self.type(schema['payload']) if schema['payload'] != None else None)
+
+    def batch(self, schema):
+        return IrBatch(schema)
+
+class IrSchema:
+    def __init__(self, schema):
+        builder = IrBuilder()
+        self.enums = [builder.declare(a) for a in schema if a['tag'] == 'enum']
+        records = [(a, builder.declare(a)) for a in schema if a['tag'] == 'record']
+        self.records = [builder.record(a, record) for a, record in records]
+        self.services = [builder.service(a) for a in schema if a['tag'] == 'service']
+        self.notifications = [builder.notification(a) for a in schema if a['tag'] == 'notification']
+        self.batches = [builder.batch(a) for a in schema if a['tag'] == 'batch']
+        self.builder = builder
+        self.resolved = False
+
+    def resolve(self):
+        if not self.resolved:
+            for a in self.enums:
+                self.builder.resolve(a)
+            self.resolved = True
+        return self
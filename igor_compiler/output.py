@@ -0,0 +1,96 @@
+import os
+from .utils import *
+
+class OutputStream:
+    def __init__(self, writer, path):
+        self.writer = writer
+        self.path = path
+        self.temp = path + '.tmp'
+        import hashlib
+        self.hash = hashlib.sha256()
+        self.file = open(self.temp, "w", encoding="utf-8")
+
+    def write(self, text):
+        self.file.write(text)
+        self.hash.update(text.encode('utf-8'))
+
+    def close(self):
+        self.file.close()
+        digest = self.hash.hexdigest()
+        if self.writer.unchanged(self.path, digest):
+            os.remove(self.temp)
+            self.writer.skipped.append(self.path)
+        else:
+            os.replace(self.temp, self.path)
+            self.writer.written.append(self.path)
+        self.writer.entries[self.path] = {'hash': digest, 'stat': self.writer.stat(self.path)}
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type == None:
+            self.close()
+        else:
+            self.abort()
+
+class OutputWriter:
+    def __init__(self, manifest=None):
+        self.manifest = manifest
+        self.entries = {}
+        self.written = []
+        self.skipped = []
+        self.removed = []
+        if manifest != None and os.path.exists(manifest):
+            try:
+                self.entries = str2json(read_file(manifest))
+            except ValueError:
+                self.entries = {}
+
+    def stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def unchanged(self, path, digest):
+        entry = self.entries.get(path)
+        if entry != None and entry['stat'] == self.stat(path):
+            return entry['hash'] == digest
+        try:
+            return text_hash(read_file(path)) == digest
+        except (OSError, ValueError):
+            return False
+
+    def write(self, path, text):
+        digest = text_hash(text)
+        if self.unchanged(path, digest):
+            self.skipped.append(path)
+        else:
+            write_file_atomic(path, text)
+            self.written.append(path)
+        self.entries[path] = {'hash': digest, 'stat': self.stat(path)}
+
+    def remove(self, path):
+        os.remove(path)
+        self.entries.pop(path, None)
+        self.removed.append(path)
+
+    def open(self, path):
+        return OutputStream(self, path)
+
+    def save(self):
+        if self.manifest != None:
+            write_file_atomic(self.manifest, json2str(self.entries))
+
+    def report(self):
+        lines = ['written: ' + a for a in self.written] + ['skipped: ' + a for a in self.skipped] + ['removed: ' + a for a in self.removed]
+        lines.append('outputs: {0} written, {1} skipped'.format(len(self.written), len(self.skipped)))
+        if self.removed:
+            lines[-1] += ', {0} removed'.format(len(self.removed))
+        return '\n'.join(lines)
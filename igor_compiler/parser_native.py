@@ -0,0 +1,425 @@
+import io, re
+from .utils import *
+
+# single pass tokenizer and recursive descent parser
+# produces the same schema as the pypeg2 grammar in parser.py
+
+token_regex = re.compile(r"(?P<space>\s+)|(?P<comment>//.*)|(?P<desc>\#.*)|(?P<word>[a-zA-Z0-9_/-]+)|(?P<symbol>[{}<>;,.@?=])")
+varname_regex = re.compile(r"[a-zA-Z_][a-zA-Z_0-9]*")
+number_regex = re.compile(r"[0-9]+")
+
+simple_types = ('number', 'int', 'string', 'bool', 'json', 'Date')
+method_types = ('POST', 'GET', 'PUT', 'DELETE')
+
+def syntax_error(msg, filename, lineno, offset, line):
+    return SyntaxError(msg, (filename, lineno, offset, line.rstrip('\n')))
+
+def tokenize(lines, filename=None):
+    lineno = 0
+    line = ''
+    for lineno, line in enumerate(lines, 1):
+        pos = 0
+        end = len(line)
+        while pos < end:
+            m = token_regex.match(line, pos)
+            if m is None:
+                raise syntax_error('unexpected character ' + repr(line[pos]), filename, lineno, pos + 1, line)
+            kind = m.lastgroup
+            if kind != 'space' and kind != 'comment':
+                yield (kind, m.group(), lineno, pos + 1, line)
+            pos = m.end()
+    yield ('eof', '', lineno, len(line) + 1, line)
+
+class NativeParser:
+    def __init__(self, tokens, filename=None):
+        self.tokens = tokens
+        self.filename = filename
+        self.lookahead = []
+        self.data = []
+        self.record_name = []
+        self.service_name = None
+
+    def add(self, item):
+        self.data.append(item)
+
+    def capture(self, build, *args):
+        data, self.data = self.data, []
+        res = build(*args)
+        added, self.data = self.data, data
+        return res, added
+
+    def peek(self, index=0):
+        while len(self.lookahead) <= index:
+            self.lookahead.append(next(self.tokens, None) or self.lookahead[-1])
+        return self.lookahead[index]
+
+    def take(self):
+        token = self.peek()
+        del self.lookahead[0]
+        return token
+
+    def is_next(self, value, index=0):
+        return self.peek(index)[1] == value
+
+    def accept(self, value):
+        if self.is_next(value):
+            self.take()
+            return True
+        return False
+
+    def error(self, expected):
+        kind, value, lineno, offset, line = self.peek()
+        found = 'end of file' if kind == 'eof' else repr(value)
+        return syntax_error('expecting ' + expected + ', found ' + found, self.filename, lineno, offset, line)
+
+    def expect(self, value):
+        if not self.accept(value):
+            raise self.error(repr(value))
+
+    def word(self, regex, expected):
+        kind, value = self.peek()[:2]
+        if kind != 'word' or not regex.fullmatch(value):
+            raise self.error(expected)
+        self.take()
+        return value
+
+    def name(self):
+        return self.word(varname_regex, 'name')
+
+    def number(self):
+        return int(self.word(number_regex, 'number'))
+
+    def desc(self):
+        if self.peek()[0] == 'desc':
+            return self.take()[1][1:]
+        return None
+
+    def definitions(self):
+        while self.peek()[0] != 'eof':
+            self.definition()
+            yield from self.data
+            self.data = []
+
+    def file(self):
+        return list(self.definitions())
+
+    def definition(self):
+        desc = self.desc()
+        if self.accept('enum'): self.enum(desc)
+        elif self.accept('record'): self.record(desc)
+        elif self.accept('service'): self.service(desc)
+        elif self.accept('notification'): self.notification(desc)
+        elif self.accept('batch'): self.batch(desc)
+        else: raise self.error('enum, record, service, notification or batch')
+
+    def type(self):
+        kind, value = self.peek()[:2]
+        if kind == 'word' and value in simple_types:
+            self.take()
+            return {
+                'tag': value,
+            }
+        if value == 'list' and self.is_next('<', 1):
+            self.take()
+            self.take()
+            item_type = self.type()
+            self.expect('>')
+            return {
+                'tag': 'list',
+                'item_type': item_type,
+            }
+        if value == 'dict' and self.is_next('<', 1):
+            self.take()
+            self.take()
+            self.expect('string')
+            self.expect(',')
+            value_type = self.type()
+            self.expect('>')
+            return {
+                'tag': 'dict',
+                'value_type': value_type,
+            }
+        return {
+            'tag': 'ref',
+            'ref': self.name(),
+        }
+
+    def enum_body(self):
+        self.expect('{')
+        items = []
+        while not self.accept('}'):
+            desc = self.desc()
+            name = self.name()
+            ref = None
+            if self.accept('.'):
+                ref, name = name, self.name()
+            self.expect(';')
+            items.append({
+                'description': desc or '',
+                'name': name,
+                'ref': ref
+            })
+        return items
+
+    def enum(self, desc):
+        self.add({
+            'tag': 'enum',
+            'description': desc or '',
+            'name': self.name(),
+            'items': self.enum_body()
+        })
+
+    def is_inline_enum(self):
+        if not self.is_next('enum'):
+            return False
+        return self.is_next('@', 1) or self.is_next('?', 1) or self.is_next('{', 2)
+
+    def record_item(self, desc):
+        prop = self.accept('@')
+        optional = self.accept('?')
+        type = self.type()
+        name = self.name()
+        self.expect(';')
+        return {
+            'name': name,
+            'description': desc or '',
+            'type': type,
+            'optional': optional,
+            'property': prop
+        }
+
+    def record_inline_enum(self, desc):
+        self.expect('enum')
+        prop = self.accept('@')
+        optional = self.accept('?')
+        name = self.name()
+        fullname = make_name(self.record_name + [name, 'enum'])
+        self.add({
+            'tag': 'enum',
+            'description': desc or '',
+            'name': fullname,
+            'items': self.enum_body()
+        })
+        return {
+            'name': name,
+            'description': desc or '',
+            'type': {
+                'tag': 'ref',
+                'ref': fullname,
+            },
+            'optional': optional,
+            'property': prop
+        }
+
+    def record_body(self):
+        self.expect('{')
+        items = []
+        while not self.accept('}'):
+            desc = self.desc()
+            if self.is_inline_enum():
+                items.append(self.record_inline_enum(desc))
+            else:
+                items.append(self.record_item(desc))
+        return items
+
+    def record(self, desc):
+        self.record_name = [self.name()]
+        self.add({
+            'tag': 'record',
+            'description': desc or '',
+            'name': make_name(self.record_name),
+            'items': self.record_body()
+        })
+        self.record_name = []
+
+    def service_data(self):
+        if self.is_next('record') and self.is_next('{', 1):
+            self.take()
+            name = make_name(self.record_name)
+            self.add({
+                'tag': 'record',
+                'description': '',
+                'name': name,
+                'items': self.record_body()
+            })
+            return {
+                'tag': 'ref',
+                'ref': name
+            }
+        type = self.type()
+        self.expect(';')
+        return type
+
+    def service_method(self):
+        kind, value = self.peek()[:2]
+        if kind != 'word' or value not in method_types:
+            raise self.error('one of ' + ', '.join(method_types))
+        self.take()
+        self.expect(';')
+        return value
+
+    def service_url(self):
+        url = []
+        while not url or not self.accept(';'):
+            if self.accept('{'):
+                url.append({
+                    'tag': 'param',
+                    'param': self.name(),
+                })
+                self.expect('}')
+            elif self.peek()[0] == 'word':
+                url.append({
+                    'tag': 'url',
+                    'url': self.take()[1],
+                })
+            else:
+                raise self.error('url')
+        return url
+
+    def service_cache(self):
+        ttl = self.number()
+        size = self.number() if self.accept(',') else None
+        self.expect(';')
+        return {
+            'ttl': ttl,
+            'size': size
+        }
+
+    def service_param(self, desc):
+        kind, value = self.peek()[:2]
+        if kind != 'word' or value not in simple_types:
+            raise self.error('one of ' + ', '.join(simple_types))
+        self.take()
+        name = self.name()
+        self.expect(';')
+        return {
+            'name': name,
+            'description': desc or '',
+            'type': {
+                'tag': value,
+            }
+        }
+
+    def service_query(self, desc):
+        kind, value = self.peek()[:2]
+        if kind == 'word' and value in simple_types:
+            self.take()
+            type = {
+                'tag': value,
+            }
+        else:
+            type = {
+                'tag': 'ref',
+                'ref': self.name(),
+            }
+        name = self.name()
+        self.expect(';')
+        return {
+            'name': name,
+            'description': desc or '',
+            'type': type
+        }
+
+    def service_body(self):
+        self.record_name = [self.service_name, 'request', 'body']
+        res = self.service_data()
+        self.record_name = []
+        return res
+
+    def service_response(self, desc):
+        status = self.number()
+        self.record_name = [self.service_name, 'response', str(status)]
+        res = {
+            'status': status,
+            'description': desc or '',
+            'type': self.service_data()
+        }
+        self.record_name = []
+        return res
+
+    def service(self, desc):
+        self.service_name = self.name()
+        self.expect('{')
+        methods, urls, caches, bodies, query, params, responses = [], [], [], [], [], [], []
+        while not self.accept('}'):
+            item_desc = self.desc()
+            if item_desc is None and self.accept('method'): methods.append(self.service_method())
+            elif item_desc is None and self.accept('url'): urls.append(self.service_url())
+            elif item_desc is None and self.accept('cache'): caches.append(self.service_cache())
+            elif self.accept('param'): params.append(self.service_param(item_desc))
+            elif self.accept('query'): query.append(self.service_query(item_desc))
+            elif item_desc is None and self.accept('body'): bodies.append(self.capture(self.service_body))
+            elif self.accept('response'): responses.append(self.capture(self.service_response, item_desc))
+            else: raise self.error('method, url, cache, param, query, body or response')
+        # inline records are added in the order the pypeg2 grammar builds them
+        body, added = bodies[0] if bodies else (None, [])
+        self.data += added
+        for response, added in responses:
+            self.data += added
+        service = {
+            'tag': 'service',
+            'description': desc or '',
+            'name': self.service_name,
+            'method': methods[0] if methods else None,
+            'url': urls[0] if urls else None,
+            'body': body,
+            'query': query,
+            'params': params,
+            'responses': [response for response, added in responses],
+        }
+        if caches:
+            service['cache'] = caches[0]
+        self.add(service)
+        self.service_name = None
+
+    def notification_payload(self):
+        self.record_name = [self.service_name]
+        res = self.service_data()
+        self.record_name = []
+        return res
+
+    def notification(self, desc):
+        self.service_name = self.name()
+        self.expect('{')
+        kinds, payloads = [], []
+        while not self.accept('}'):
+            if self.accept('kind'):
+                kinds.append(self.name())
+                self.expect(';')
+            elif self.accept('payload'):
+                payloads.append(self.capture(self.notification_payload))
+            else:
+                raise self.error('kind or payload')
+        payload, added = payloads[0] if payloads else (None, [])
+        self.data += added
+        self.add({
+            'tag': 'notification',
+            'description': desc or '',
+            'name': self.service_name,
+            'kind': kinds[0] if kinds else None,
+            'payload': payload,
+        })
+        self.service_name = None
+
+    def batch(self, desc):
+        name = self.name()
+        self.expect('{')
+        urls = []
+        while not self.accept('}'):
+            if self.accept('url'):
+                urls.append(self.service_url())
+            else:
+                raise self.error('url')
+        self.add({
+            'tag': 'batch',
+            'description': desc or '',
+            'name': name,
+            'url': urls[0] if urls else None,
+        })
+
+def parse_native(text, filename=None):
+    return NativeParser(tokenize(io.StringIO(text), filename), filename).file()
+
+def parse_native_file(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        yield from NativeParser(tokenize(f, filename), filename).definitions()
@@ -0,0 +1,78 @@
+import io, time, contextlib
+from .utils import *
+
+# reset_peak is new in python 3.9; before that only restarting tracemalloc
+# resets the peak, which also forgets the earlier allocations
+def reset_peak(tracemalloc):
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.stop()
+        tracemalloc.start()
+
+class Profiler:
+    def __init__(self, enabled=False, top=0):
+        self.enabled = enabled or top > 0
+        self.top = top
+        self.records = []
+        self.cprofile = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        import tracemalloc
+        tracemalloc.start()
+        if self.top > 0:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        if self.cprofile != None:
+            self.cprofile.disable()
+        import tracemalloc
+        tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def measure(self, phase, name):
+        if not self.enabled:
+            yield
+            return
+        import tracemalloc
+        reset_peak(tracemalloc)
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base
+            self.records.append({'phase': phase, 'name': name, 'seconds': seconds, 'peak_memory': peak})
+
+    def hottest(self):
+        if self.cprofile == None:
+            return []
+        import pstats
+        stats = pstats.Stats(self.cprofile, stream=io.StringIO())
+        rows = []
+        for (file, line, fun), (cc, nc, tt, ct, callers) in stats.stats.items():
+            rows.append({'function': '{0}:{1}({2})'.format(file, line, fun), 'calls': nc, 'total': tt, 'cumulative': ct})
+        rows.sort(key=lambda a: a['total'], reverse=True)
+        return rows[:self.top]
+
+    def report(self):
+        lines = ['{0:10} {1:10} {2:>12}  {3}'.format('phase', 'seconds', 'peak KiB', 'name')]
+        for a in self.records:
+            lines.append('{0:10} {1:10.4f} {2:12.1f}  {3}'.format(a['phase'], a['seconds'], a['peak_memory'] / 1024, a['name']))
+        hottest = self.hottest()
+        if hottest:
+            lines.append('')
+            lines.append('{0:>10} {1:>10} {2:>10}  {3}'.format('calls', 'total', 'cumul', 'function'))
+            for a in hottest:
+                lines.append('{0:10} {1:10.4f} {2:10.4f}  {3}'.format(a['calls'], a['total'], a['cumulative'], a['function']))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {'phases': self.records, 'hottest': self.hottest()}
@@ -0,0 +1,262 @@
+import os, sys, json, time
+from .parser import IgorParser
+from .output import OutputWriter
+from .compiler import version, igor_info
+from .api import generate_python
+from .emitter import render
+from .utils import *
+
+# json-rpc 2.0 server, one request per line on stdin, one response per line on stdout
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def type_refs(type):
+    while type['tag'] in ('list', 'dict'):
+        type = type['item_type'] if type['tag'] == 'list' else type['value_type']
+    return [type['ref']] if type['tag'] == 'ref' else []
+
+# enum and record names a definition's generated code depends on
+def definition_refs(a):
+    if a['tag'] == 'enum':
+        return [b['ref'] for b in a['items'] if b.get('ref') != None]
+    if a['tag'] == 'record':
+        types = [b['type'] for b in a['items']]
+    elif a['tag'] == 'service':
+        types = [b['type'] for b in a['params'] + a['query'] + a['responses']] + ([a['body']] if a['body'] != None else [])
+    elif a['tag'] == 'notification':
+        types = [a['payload']] if a.get('payload') != None else []
+    else:
+        types = []
+    return [r for t in types for r in type_refs(t)]
+
+def diagnostic(name, error):
+    return {
+        'file': name,
+        'line': error.lineno,
+        'offset': error.offset,
+        'text': error.text,
+        'message': error.msg,
+    }
+
+class IgorServer:
+    def __init__(self, engine='pypeg2', schema=None, typescript=None, compact=False, manifest=None,
+                 layout='single', codec='helpers', records='mutable', compact_codec=False, python=None):
+        self.engine = engine
+        self.schema_path = schema
+        self.typescript_path = typescript
+        self.python_path = python
+        self.compact = compact
+        self.layout = layout
+        self.codec = codec
+        self.records = records
+        self.compact_codec = compact_codec
+        self.output = OutputWriter(manifest)
+        self.sources = {}
+        self.parsed = {}
+        self.errors = {}
+        self.schema = []
+        self.files = {}
+        self.python_files = {}
+        self.signatures = {}
+        self.dirty = True
+        self.running = True
+        self.methods = {
+            'updateFile': self.update_file,
+            'removeFile': self.remove_file,
+            'compile': self.compile,
+            'getSchema': self.get_schema,
+            'getFile': self.get_file,
+            'getDiagnostics': self.get_diagnostics,
+            'shutdown': self.shutdown,
+        }
+
+    def update_file(self, name, text=None):
+        if text == None:
+            text = read_file(name)
+        if self.sources.get(name) == text:
+            return {'changed': False}
+        self.sources[name] = text
+        self.errors.pop(name, None)
+        p = IgorParser(self.engine)
+        if p.parse_text(text, name):
+            self.parsed[name] = p.data
+        else:
+            self.parsed.pop(name, None)
+            self.errors[name] = diagnostic(name, p.error)
+        self.dirty = True
+        return {'changed': True, 'diagnostics': [self.errors[name]] if name in self.errors else []}
+
+    def remove_file(self, name):
+        if name not in self.sources:
+            return {'changed': False}
+        for a in [self.sources, self.parsed, self.errors]:
+            a.pop(name, None)
+        self.dirty = True
+        return {'changed': True}
+
+    def compile(self):
+        if self.errors:
+            return {'ok': False, 'changed': False, 'diagnostics': self.get_diagnostics()['diagnostics']}
+        changed = self.dirty
+        if self.dirty:
+            groups = [(name, self.parsed[name]) for name in sorted(self.sources)]
+            self.schema = [a for name, data in groups for a in data]
+            stale = set(self.files)
+            changed = self.generate(groups)
+            # python is only generated when the server was started with a python folder
+            if self.python_path == None:
+                self.python_files = {}
+            elif changed or not self.python_files:
+                self.python_files = generate_python(self.schema)
+            self.dirty = False
+            self.save(stale - set(self.files))
+        return {'ok': True, 'changed': changed, 'diagnostics': [], 'files': sorted(list(self.files) + list(self.python_files))}
+
+    # a definition's signature is its schema and the output holding it; only
+    # outputs holding a changed definition, or one depending on it, are rendered
+    def generate(self, groups):
+        from .generator_ts import IgorGeneratorTs, modules_folder, helpers_path
+        ts = IgorGeneratorTs(self.schema, verbose=False, codec=self.codec, records=self.records, compact=self.compact_codec)
+        modules = ts.data_modules(self.layout, groups) if self.layout != 'single' else []
+        paths = {b.name: a.path for a in modules for b in a.definitions}
+        outputs = {'service': 'protocol.service.ts', 'batch': 'protocol.service.ts', 'notification': 'protocol.notification.ts'}
+        signatures = {}
+        for a in self.schema:
+            path = outputs.get(a['tag']) or paths.get(a['name'], 'protocol.data.ts')
+            signatures[(a['tag'], a['name'])] = (json2str(a, True), path)
+        changed = [k for k in sorted(set(signatures) | set(self.signatures)) if signatures.get(k) != self.signatures.get(k)]
+        users = {}
+        for a in self.schema:
+            for name in definition_refs(a):
+                users.setdefault(name, []).append((a['tag'], a['name']))
+        affected = set(changed)
+        stack = list(changed)
+        while stack:
+            tag, name = stack.pop()
+            if tag not in ('enum', 'record'):
+                continue
+            for k in users.get(name, []):
+                if k not in affected:
+                    affected.add(k)
+                    stack.append(k)
+        rebuild = {s[1] for k in affected for s in (signatures.get(k), self.signatures.get(k)) if s != None}
+        # the index lists the modules
+        if {a.path for a in modules} != {a for a in self.files if a.startswith(modules_folder + '/')} - {helpers_path}:
+            rebuild.add('protocol.data.ts')
+
+        prefix = igor_info.format(version=version)
+        files = {}
+        def output(path, emit, *args):
+            files[path] = prefix + render(emit, *args) if path in rebuild or path not in self.files else self.files[path]
+        if self.layout == 'single':
+            output('protocol.data.ts', ts.emit_data)
+        else:
+            owners = ts.module_owners(modules)
+            output(helpers_path, ts.emit_helpers)
+            for a in modules:
+                output(a.path, ts.emit_module, a, owners)
+            output('protocol.data.ts', ts.emit_index, modules)
+        output('protocol.service.ts', ts.emit_service)
+        output('protocol.notification.ts', ts.emit_notification)
+        self.files = files
+        self.signatures = signatures
+        return changed
+
+    def save(self, stale=()):
+        self.output.written = []
+        self.output.skipped = []
+        self.output.removed = []
+        if self.schema_path != None:
+            self.output.write(self.schema_path, json2str(self.schema, self.compact))
+        if self.typescript_path != None:
+            for name, text in self.files.items():
+                path = os.path.join(self.typescript_path, name)
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                self.output.write(path, text)
+            # outputs of removed definitions, only files we generated
+            head = igor_info.split('\n')[0]
+            for name in sorted(stale):
+                path = os.path.join(self.typescript_path, name)
+                if os.path.exists(path) and read_file(path).startswith(head):
+                    self.output.remove(path)
+        if self.python_path != None:
+            for name, text in self.python_files.items():
+                self.output.write(os.path.join(self.python_path, name), text)
+        self.output.save()
+
+    def get_schema(self):
+        self.compile()
+        return {'schema': self.schema}
+
+    def get_file(self, name):
+        self.compile()
+        files = self.python_files if name in self.python_files else self.files
+        if name not in files:
+            raise RpcError(INVALID_PARAMS, 'unknown generated file ' + name)
+        return {'name': name, 'text': files[name]}
+
+    def get_diagnostics(self):
+        return {'diagnostics': [self.errors[name] for name in self.sources if name in self.errors]}
+
+    def shutdown(self):
+        self.running = False
+        return {}
+
+    def call(self, request):
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            raise RpcError(INVALID_REQUEST, 'invalid request')
+        method = self.methods.get(request['method'])
+        if method == None:
+            raise RpcError(METHOD_NOT_FOUND, 'unknown method ' + request['method'])
+        params = request.get('params', {})
+        try:
+            if isinstance(params, list):
+                return method(*params)
+            return method(**params)
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+
+    def handle(self, line):
+        start = time.perf_counter()
+        request = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RpcError(PARSE_ERROR, str(e))
+            result = self.call(request)
+            result['time'] = time.perf_counter() - start
+            response = {'jsonrpc': '2.0', 'result': result}
+        except RpcError as e:
+            response = {'jsonrpc': '2.0', 'error': {'code': e.code, 'message': e.message, 'data': {'time': time.perf_counter() - start}}}
+        except (OSError, GenerationError) as e:
+            response = {'jsonrpc': '2.0', 'error': {'code': -32000, 'message': str(e), 'data': {'time': time.perf_counter() - start}}}
+        if isinstance(request, dict):
+            if 'id' not in request:
+                return None
+            response['id'] = request['id']
+        else:
+            response['id'] = None
+        return response
+
+    def serve(self, stdin=None, stdout=None):
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+        for line in stdin:
+            if not line.strip():
+                continue
+            response = self.handle(line)
+            if response != None:
+                stdout.write(json.dumps(response) + '\n')
+                stdout.flush()
+            if not self.running:
+                break
@@ -1,4 +1,4 @@
-import json
+import os, json
 
 class GenerationError(Exception):
     pass
@@ -10,12 +10,52 @@ def read_file(file):
 def write_file(file, text):
     with open(file, "w", encoding="utf-8") as f:
         f.write(text)
+
+def write_file_atomic(file, text):
+    temp = file + '.tmp'
+    try:
+        write_file(temp, text)
+        os.replace(temp, file)
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def text_hash(text):
+    import hashlib
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
         
+# inflection is imported on first use, importing the generators stays cheap
+def camelize(text, upper=True):
+    import inflection
+    return inflection.camelize(text, upper)
+
+def underscore(text):
+    import inflection
+    return inflection.underscore(text)
+
+def make_name(data):
+    return camelize('_'.join(data))
+
 def json2str(obj, compact=False):
     if compact:
         return json.dumps(obj, sort_keys=True, separators=(',',':'))
     else:
         return json.dumps(obj, sort_keys=True, indent=4, separators=(',', ': '))
 
+def json_chunks(items, compact=False):
+    empty = True
+    for a in items:
+        if compact:
+            yield ('[' if empty else ',') + json.dumps(a, sort_keys=True, separators=(',',':'))
+        else:
+            text = json.dumps(a, sort_keys=True, indent=4, separators=(',', ': '))
+            yield ('[\n' if empty else ',\n') + '\n'.join(['    ' + b for b in text.split('\n')])
+        empty = False
+    if empty:
+        yield '[]'
+    else:
+        yield ']' if compact else '\n]'
+
 def str2json(str):
     return json.loads(str)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os, glob, time, select, ctypes, ctypes.util
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+
+class Inotify:
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        for d in dirs:
+            if libc.inotify_add_watch(self.fd, os.fsencode(d), self.mask) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed: ' + d)
+
+    def wait(self, timeout):
+        ready = select.select([self.fd], [], [], timeout)[0]
+        self.drain()
+        return bool(ready)
+
+    def drain(self):
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def inotify(dirs):
+    try:
+        return Inotify(dirs)
+    except (OSError, AttributeError, TypeError):
+        return None
+
+class Watcher:
+    def __init__(self, patterns, delay=0.3, interval=1.0):
+        self.patterns = patterns
+        self.delay = delay
+        self.interval = interval
+        self.state = self.snapshot()
+        self.notify = inotify(self.dirs())
+
+    @property
+    def mode(self): return 'inotify' if self.notify != None else 'polling'
+
+    def dirs(self):
+        return sorted({d for g in self.patterns for d in glob.glob(os.path.dirname(g) or '.')})
+
+    def snapshot(self):
+        res = {}
+        for g in self.patterns:
+            for f in glob.glob(g):
+                try:
+                    st = os.stat(f)
+                    res[f] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    pass
+        return res
+
+    def sleep(self, timeout):
+        if self.notify != None:
+            self.notify.wait(timeout)
+        else:
+            time.sleep(timeout)
+
+    def wait(self):
+        state = self.state
+        while state == self.state:
+            self.sleep(self.interval)
+            state = self.snapshot()
+        # debounce: wait until the files stop changing
+        while True:
+            time.sleep(self.delay)
+            current = self.snapshot()
+            if current == state:
+                break
+            state = current
+        if self.notify != None:
+            self.notify.drain()
+        changed = {f for f in set(state) | set(self.state) if state.get(f) != self.state.get(f)}
+        self.state = state
+        return changed
+
+    def close(self):
+        if self.notify != None:
+            self.notify.close()
+            self.notify = None
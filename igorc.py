@@ -1,6 +1,8 @@
+import multiprocessing
 from igor_compiler import IgorCompiler
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     compiler = IgorCompiler()
     if compiler.parse_args():
         compiler.run()
\ No newline at end of file
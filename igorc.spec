@@ -7,10 +7,11 @@ a = Analysis(['igorc.py'],
              pathex=[],
              binaries=[],
              datas=[],
-             hiddenimports=[],
+             hiddenimports=['igor_compiler.compiler', 'igor_compiler.parser', 'igor_compiler.grammar',
+                            'igor_compiler.generator_ts', 'igor_compiler.api', 'igor_compiler.server'],
              hookspath=[],
              runtime_hooks=[],
-             excludes=[],
+             excludes=['tkinter'],
              win_no_prefer_redirects=False,
              win_private_assemblies=False,
              cipher=block_cipher)